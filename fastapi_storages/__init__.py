@@ -1,10 +1,14 @@
 from .base import StorageFile, StorageImage
 from .filesystem import FileSystemStorage
+from .memory import MemoryStorage
+from .replicated import ReplicatedStorage
 from .s3 import S3Storage
 
 __version__ = "0.3.0"
 __all__ = [
     "FileSystemStorage",
+    "MemoryStorage",
+    "ReplicatedStorage",
     "S3Storage",
     "StorageFile",
     "StorageImage",
@@ -1,4 +1,35 @@
-from typing import BinaryIO
+import threading
+from pathlib import Path
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from fastapi_storages.utils import iter_concurrently
+
+
+class FileInfo(NamedTuple):
+    """
+    Metadata of a stored file returned when listing a storage.
+    """
+
+    name: str
+    """File name as stored in the database."""
+
+    size: int
+    """File size in bytes."""
+
+    mtime: float
+    """Last modification time as a Unix timestamp."""
 
 
 class BaseStorage:  # pragma: no cover
@@ -6,6 +37,13 @@ class BaseStorage:  # pragma: no cover
     """Whether to overwrite existing files
     if the name is the same or add a suffix to the filename."""
 
+    MAX_FILE_SIZE: Optional[int] = None
+    """Maximum file size in bytes. Writes are aborted as soon as it is exceeded."""
+
+    ALLOWED_CONTENT_TYPES: Optional[Sequence[str]] = None
+    """Content types allowed to be written, detected from the file contents.
+    Supports wildcards like `image/*`."""
+
     def get_name(self, name: str) -> str:
         raise NotImplementedError()
 
@@ -15,9 +53,15 @@ class BaseStorage:  # pragma: no cover
     def get_size(self, name: str) -> int:
         raise NotImplementedError()
 
+    def get_metadata(self, name: str) -> FileInfo:
+        raise NotImplementedError()
+
     def open(self, name: str) -> BinaryIO:
         raise NotImplementedError()
 
+    def view(self, name: str) -> memoryview:
+        raise NotImplementedError()
+
     def write(self, file: BinaryIO, name: str) -> str:
         raise NotImplementedError()
 
@@ -27,6 +71,78 @@ class BaseStorage:  # pragma: no cover
     def generate_new_filename(self, filename: str) -> str:
         raise NotImplementedError()
 
+    def iter_files(self, prefix: str = "") -> Iterator[FileInfo]:
+        raise NotImplementedError()
+
+    def get_metadata_many(
+        self, names: Iterable[str], max_workers: int = 8
+    ) -> Dict[str, FileInfo]:
+        """
+        Get the metadata of many files concurrently using a pool of threads.
+        Returns a mapping of the given names to their metadata,
+        files which don't exist are left out.
+        """
+
+        names = list(names)
+        metadata: Dict[str, FileInfo] = {}
+        for name, future in zip(
+            names, iter_concurrently(self.get_metadata, names, max_workers)
+        ):
+            try:
+                metadata[name] = future.result()
+            except FileNotFoundError:
+                pass
+
+        return metadata
+
+    def write_many(
+        self, files: Iterable[Tuple[BinaryIO, str]], max_workers: int = 8
+    ) -> List[Union["StorageFile", Exception]]:
+        """
+        Write many `(file, name)` pairs concurrently using a pool of threads.
+        Input is consumed lazily, only a few files ahead of the running writes.
+
+        Returns the written `StorageFile` or the raised exception
+        for each input, in input order.
+        Unless existing files are overwritten, names are reserved for the
+        whole call, so duplicate names within the batch get unique suffixes.
+        """
+
+        lock = threading.Lock()
+        reserved: Set[str] = set()
+
+        def reserve_name(name: str) -> str:
+            stem, suffix = Path(name).stem, Path(name).suffix
+            counter = 0
+            candidate = name
+            while True:
+                filename = self.generate_new_filename(candidate)
+                with lock:
+                    if self.get_name(filename) not in reserved:
+                        reserved.add(self.get_name(filename))
+                        return filename
+
+                counter += 1
+                candidate = f"{stem}_{counter}{suffix}"
+
+        def write(item: Tuple[BinaryIO, str]) -> StorageFile:
+            file, name = item
+            if not self.OVERWRITE_EXISTING_FILES:
+                name = reserve_name(name)
+
+            # Written directly, StorageFile.write would generate the name again.
+            result = self.write(file=file, name=name)
+            return StorageFile(name=self.get_name(result), storage=self)
+
+        results: List[Union[StorageFile, Exception]] = []
+        for future in iter_concurrently(write, files, max_workers):
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                results.append(exc)
+
+        return results
+
 
 class StorageFile(str):
     """
@@ -39,6 +155,7 @@ class StorageFile(str):
     def __init__(self, *, name: str, storage: BaseStorage):
         self._name = name
         self._storage = storage
+        self._metadata: Optional[FileInfo] = None
 
     @property
     def name(self) -> str:
@@ -56,6 +173,9 @@ class StorageFile(str):
     def size(self) -> int:
         """File size in bytes."""
 
+        if self._metadata is not None:
+            return self._metadata.size
+
         return self._storage.get_size(self._name)
 
     def open(self) -> BinaryIO:
@@ -65,43 +185,95 @@ class StorageFile(str):
 
         return self._storage.open(self._name)
 
+    def view(self) -> memoryview:
+        """
+        Get a read-only view of the file contents.
+        """
+
+        return self._storage.view(self._name)
+
     def write(self, file: BinaryIO) -> str:
         """
         Write input file which is opened in binary mode to destination.
         """
 
+        self._metadata = None
         if not self._storage.OVERWRITE_EXISTING_FILES:
             self._name = self._storage.generate_new_filename(self._name)
 
-        return self._storage.write(file=file, name=self._name)
+        result = self._storage.write(file=file, name=self._name)
+        # Storages may store the file under a different name, like S3 versioned keys.
+        self._name = self._storage.get_name(result)
+        return result
 
     def delete(self) -> None:
         """
         Delete file from the storage
         """
 
+        self._metadata = None
         return self._storage.delete(self._name)
 
     def __str__(self) -> str:
         return self.path
 
 
+def prefetch_metadata(
+    files: Iterable[Optional[StorageFile]], max_workers: int = 8
+) -> None:
+    """
+    Fetch the metadata of many files in one batch per storage,
+    so reading properties like `size` afterwards doesn't make a request per file.
+    """
+
+    by_storage: Dict[int, List[StorageFile]] = {}
+    for file in files:
+        if file is not None:
+            by_storage.setdefault(id(file._storage), []).append(file)
+
+    for storage_files in by_storage.values():
+        storage = storage_files[0]._storage
+        metadata = storage.get_metadata_many(
+            {file._name for file in storage_files}, max_workers=max_workers
+        )
+        for file in storage_files:
+            file._metadata = metadata.get(file._name)
+
+
 class StorageImage(StorageFile):
     """
     Inherits features of `StorageFile` and adds image specific properties.
     """
 
     def __new__(
-        cls, name: str, storage: BaseStorage, height: int, width: int
+        cls,
+        name: str,
+        storage: BaseStorage,
+        height: int,
+        width: int,
+        orientation: int = 1,
+        blurhash: Optional[str] = None,
+        dominant_color: Optional[str] = None,
     ) -> "StorageImage":
         return str.__new__(cls, storage.get_path(name))
 
     def __init__(
-        self, *, name: str, storage: BaseStorage, height: int, width: int
+        self,
+        *,
+        name: str,
+        storage: BaseStorage,
+        height: int,
+        width: int,
+        orientation: int = 1,
+        blurhash: Optional[str] = None,
+        dominant_color: Optional[str] = None,
     ) -> None:
         super().__init__(name=name, storage=storage)
         self._width = width
         self._height = height
+        self._orientation = orientation
+        self._blurhash = blurhash
+        self._dominant_color = dominant_color
 
     @property
     def height(self) -> int:
@@ -118,3 +290,27 @@ class StorageImage(StorageFile):
         """
 
         return self._width
+
+    @property
+    def orientation(self) -> int:
+        """
+        EXIF orientation from 1 to 8, 1 if the image should be displayed as stored.
+        """
+
+        return self._orientation
+
+    @property
+    def blurhash(self) -> Optional[str]:
+        """
+        BlurHash placeholder of the image, if metadata was extracted.
+        """
+
+        return self._blurhash
+
+    @property
+    def dominant_color(self) -> Optional[str]:
+        """
+        Most common color of the image like `#a1b2c3`, if metadata was extracted.
+        """
+
+        return self._dominant_color
@@ -0,0 +1,75 @@
+import gzip
+import zlib
+from typing import Any, BinaryIO, Tuple, cast
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore
+
+
+def get_encodings() -> Tuple[str, ...]:
+    """
+    Get the supported content encodings.
+    """
+
+    if zstandard is None:  # pragma: no cover
+        return ("gzip",)
+    return ("gzip", "zstd")
+
+
+class CompressedFile:
+    """
+    Wrapper around a file object opened in binary mode which compresses
+    the data while it is being read, so it can be streamed to a storage
+    without compressing the whole file upfront.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, file: BinaryIO, encoding: str) -> None:
+        assert encoding in get_encodings(), f"Unsupported encoding '{encoding}'"
+
+        self._file = file
+        self._compressor: Any
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        else:
+            self._compressor = zstandard.ZstdCompressor().compressobj()
+        self._buffer = bytearray()
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = self._file.read(self.chunk_size)
+            if chunk:
+                self._buffer += self._compressor.compress(chunk)
+            else:
+                self._buffer += self._compressor.flush()
+                self._eof = True
+
+        if size < 0:
+            size = len(self._buffer)
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def seekable(self) -> bool:
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+
+def decompress(file: BinaryIO, encoding: str) -> BinaryIO:
+    """
+    Wrap a file object of compressed data to decompress it lazily while reading.
+    """
+
+    assert encoding in get_encodings(), f"Unsupported encoding '{encoding}'"
+
+    if encoding == "gzip":
+        return cast(BinaryIO, gzip.GzipFile(fileobj=file, mode="rb"))
+
+    return cast(BinaryIO, zstandard.ZstdDecompressor().stream_reader(file))
@@ -1,21 +1,62 @@
+import hashlib
+import mmap
+import os
+import re
+import uuid
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, Iterator
 
-from fastapi_storages.base import BaseStorage
-from fastapi_storages.utils import secure_filename
+from fastapi_storages.base import BaseStorage, FileInfo
+from fastapi_storages.utils import (
+    get_file_size,
+    iter_concurrently,
+    limit_file,
+    secure_filename,
+    validate_size,
+)
+
+_shard_re = re.compile(r"[0-9a-f]{2}")
+
+_fdatasync = getattr(os, "fdatasync", os.fsync)
 
 
 class FileSystemStorage(BaseStorage):
     """
     File system storage which stores files in the local filesystem.
     You might want to use this with the `FileType` type.
+
+    Files are written to a temporary file in the same directory first
+    and then atomically moved to the destination,
+    so readers never see partially written files.
+
+    The `durability` controls how writes are flushed to the disk:
+
+    - `none`: Leave flushing to the operating system, fastest.
+    - `file`: Flush the file contents before it is moved to the destination.
+    - `directory`: Also flush the directory so the rename survives a crash.
+
+    With `shard_depth` files are spread over nested subdirectories named after
+    the hash of the file name, like `3f/a2/example.txt` for a depth of two.
+    The name stored in the database stays `example.txt`.
+    Existing files can be moved to the new layout with `reshard`.
     """
 
     default_chunk_size = 64 * 1024
 
-    def __init__(self, path: str) -> None:
+    durability_modes = ("none", "file", "directory")
+
+    def __init__(
+        self, path: str, durability: str = "none", shard_depth: int = 0
+    ) -> None:
+        assert (
+            durability in self.durability_modes
+        ), f"durability should be one of {', '.join(self.durability_modes)}"
+        assert 0 <= shard_depth <= 16, "shard_depth should be between 0 and 16"
+
         self._path = Path(path)
         self._path.mkdir(parents=True, exist_ok=True)
+        self._durability = durability
+        self._shard_depth = shard_depth
 
     def get_name(self, name: str) -> str:
         """
@@ -29,14 +70,28 @@ class FileSystemStorage(BaseStorage):
         Get full path to the file.
         """
 
-        return str(self._path / Path(name))
+        if not self._shard_depth:
+            return str(self._path / Path(name))
+
+        filename = self.get_name(name)
+        digest = hashlib.sha256(filename.encode()).hexdigest()
+        shards = [digest[i * 2 : i * 2 + 2] for i in range(self._shard_depth)]
+        return str(self._path.joinpath(*shards, filename))
 
     def get_size(self, name: str) -> int:
         """
         Get file size in bytes.
         """
 
-        return (self._path / name).stat().st_size
+        return Path(self.get_path(name)).stat().st_size
+
+    def get_metadata(self, name: str) -> FileInfo:
+        """
+        Get the file size and modification time.
+        """
+
+        stat = Path(self.get_path(name)).stat()
+        return FileInfo(self.get_name(name), stat.st_size, stat.st_mtime)
 
     def open(self, name: str) -> BinaryIO:
         """
@@ -46,21 +101,68 @@ class FileSystemStorage(BaseStorage):
         path = self.get_path(name)
         return open(path, "rb")
 
+    def view(self, name: str) -> memoryview:
+        """
+        Get a read-only view of the file backed by a memory map.
+        The data is served from the page cache without copying and the pages
+        are shared between processes viewing the same file.
+        Falls back to reading the file if it can not be mapped.
+        """
+
+        with self.open(name) as file:
+            try:
+                return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            except (OSError, ValueError):
+                # Empty files and some filesystems can not be mapped.
+                return memoryview(file.read())
+
     def write(self, file: BinaryIO, name: str) -> str:
         """
         Write input file which is opened in binary mode to destination.
         """
 
+        file.seek(0, 0)
+        size = get_file_size(file)
+        if size is not None:
+            # Reject known oversized files before anything is allocated on disk.
+            validate_size(size, self.MAX_FILE_SIZE)
+        file = limit_file(file, self.MAX_FILE_SIZE, self.ALLOWED_CONTENT_TYPES)
+
         filename = self.get_name(name)
-        path = self.get_path(filename)
+        path = Path(self.get_path(filename))
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        if self._shard_depth:
+            path.parent.mkdir(parents=True, exist_ok=True)
 
-        file.seek(0, 0)
-        with open(path, "wb") as output:
-            while True:
-                chunk = file.read(self.default_chunk_size)
-                if not chunk:
-                    break
-                output.write(chunk)
+        fd = os.open(
+            tmp_path,
+            os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0),
+            0o666,
+        )
+        try:
+            with open(fd, "wb") as output:
+                if size:
+                    if self.MAX_FILE_SIZE is not None:
+                        size = min(size, self.MAX_FILE_SIZE)
+                    self._preallocate(fd, size)
+
+                while True:
+                    chunk = file.read(self.default_chunk_size)
+                    if not chunk:
+                        break
+                    output.write(chunk)
+
+                if self._durability != "none":
+                    output.flush()
+                    _fdatasync(fd)
+
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        if self._durability == "directory":
+            self._sync_directory(path.parent)
 
         return str(path)
 
@@ -73,11 +175,85 @@ class FileSystemStorage(BaseStorage):
 
     def generate_new_filename(self, filename: str) -> str:
         counter = 0
-        path = self._path / filename
+        path = Path(self.get_path(filename))
         stem, extension = Path(filename).stem, Path(filename).suffix
 
         while path.exists():
             counter += 1
-            path = self._path / f"{stem}_{counter}{extension}"
+            path = Path(self.get_path(f"{stem}_{counter}{extension}"))
 
         return path.name
+
+    def iter_files(self, prefix: str = "") -> Iterator[FileInfo]:
+        """
+        Lazily iterate over the stored files whose name starts with `prefix`.
+        Files are yielded in directory order, not sorted.
+        """
+
+        for entry in self._walk(self._path):
+            if entry.name.startswith(prefix):
+                stat = entry.stat()
+                yield FileInfo(entry.name, stat.st_size, stat.st_mtime)
+
+    def reshard(self, max_workers: int = 8) -> int:
+        """
+        Move existing files to the layout of the current `shard_depth`
+        using a pool of threads, for example to migrate a flat directory.
+        Returns the number of moved files.
+        """
+
+        def move(source: str) -> bool:
+            target = self.get_path(os.path.basename(source))
+            if source == target or os.path.exists(target):
+                return False
+
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(source, target)
+            return True
+
+        sources = (entry.path for entry in self._walk(self._path))
+        moved = sum(
+            future.result() for future in iter_concurrently(move, sources, max_workers)
+        )
+
+        for root, _, _ in os.walk(self._path, topdown=False):
+            parts = Path(root).relative_to(self._path).parts
+            if parts and all(_shard_re.fullmatch(part) for part in parts):
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    # Directory is not empty.
+                    pass
+
+        return moved
+
+    def _walk(self, path: Path) -> Iterator["os.DirEntry[str]"]:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if _shard_re.fullmatch(entry.name):
+                        yield from self._walk(Path(entry.path))
+                elif entry.name.startswith(".") and entry.name.endswith(".tmp"):
+                    continue
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    def _preallocate(self, fd: int, size: int) -> None:
+        if not hasattr(os, "posix_fallocate"):  # pragma: no cover
+            return
+
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:  # pragma: no cover
+            # Not supported by the underlying filesystem.
+            pass
+
+    def _sync_directory(self, path: Path) -> None:
+        if os.name == "nt":  # pragma: no cover
+            return
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,391 @@
+import io
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import closing
+from typing import (
+    BinaryIO,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
+from urllib.parse import parse_qsl, urlencode
+
+try:
+    from PIL import Image
+
+    PIL = True
+except ImportError:  # pragma: no cover
+    PIL = False
+
+from fastapi_storages.base import BaseStorage, StorageImage
+from fastapi_storages.filesystem import FileSystemStorage
+from fastapi_storages.utils import iter_concurrently
+
+_BASE83 = (
+    "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+    "#$%*+,-.:;=?@[]^_{|}~"
+)
+
+_EXIF_ORIENTATION = 0x0112
+
+
+class ImageMetadata(NamedTuple):
+    """
+    Metadata of an image extracted when it is written.
+    """
+
+    width: int
+    """Image width in pixels."""
+
+    height: int
+    """Image height in pixels."""
+
+    orientation: int
+    """EXIF orientation from 1 to 8, 1 if the image should be displayed as stored."""
+
+    blurhash: str
+    """BlurHash placeholder of the image, as displayed after orientation."""
+
+    dominant_color: str
+    """Most common color of the image like `#a1b2c3`."""
+
+
+class ImageSample(NamedTuple):
+    """
+    Downscaled RGB pixels of an image as displayed after orientation,
+    with the size and orientation of the original image.
+    """
+
+    width: int
+    height: int
+    orientation: int
+    size: Tuple[int, int]
+    pixels: bytes
+
+
+def sample_image(file: BinaryIO, sample_size: int = 32) -> ImageSample:
+    """
+    Decode a sample of at most `sample_size` pixels per side from an image file.
+    The image is decoded downscaled when the format allows,
+    so this is cheap even for large photos.
+    """
+
+    with Image.open(file) as image:
+        width, height = image.size
+        orientation = int(image.getexif().get(_EXIF_ORIENTATION, 1))
+        # Lets JPEG decode at a fraction of the size.
+        image.draft("RGB", (sample_size * 2, sample_size * 2))
+        sample = image.convert("RGB")
+
+    sample.thumbnail((sample_size, sample_size))
+    transpose = _ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose is not None:
+        sample = sample.transpose(transpose)
+
+    return ImageSample(width, height, orientation, sample.size, sample.tobytes())
+
+
+def describe_sample(sample: ImageSample) -> ImageMetadata:
+    """
+    Compute the BlurHash and dominant color of an image sample.
+    """
+
+    rgb = sample.pixels
+    pixels = list(zip(rgb[0::3], rgb[1::3], rgb[2::3]))
+    return ImageMetadata(
+        width=sample.width,
+        height=sample.height,
+        orientation=sample.orientation,
+        blurhash=encode_blurhash(pixels, *sample.size),
+        dominant_color=_get_dominant_color(Image.frombytes("RGB", sample.size, rgb)),
+    )
+
+
+def extract_metadata(data: bytes, sample_size: int = 32) -> ImageMetadata:
+    """
+    Extract the metadata of an image from its contents.
+    """
+
+    return describe_sample(sample_image(io.BytesIO(data), sample_size))
+
+
+def extract_metadata_many(
+    storage: BaseStorage, names: Sequence[str], max_workers: int = 8
+) -> Dict[str, ImageMetadata]:
+    """
+    Extract the metadata of stored images in the process pool.
+    Images of remote storages are downloaded concurrently in threads first.
+    Missing files and files which are not images are left out.
+    """
+
+    def read(name: str) -> bytes:
+        with closing(storage.open(name)) as file:
+            return file.read()
+
+    pending: List[Tuple[str, "Future[ImageMetadata]"]] = []
+    if isinstance(storage, FileSystemStorage):
+        for name in names:
+            path = storage.get_path(name)
+            pending.append((name, _get_executor().submit(_extract_path, path)))
+    else:
+        for name, future in zip(names, iter_concurrently(read, names, max_workers)):
+            try:
+                data = future.result()
+            except FileNotFoundError:
+                continue
+            pending.append((name, _get_executor().submit(extract_metadata, data)))
+
+    metadata = {}
+    for name, extracted in pending:
+        try:
+            metadata[name] = extracted.result()
+        except OSError:
+            # Missing or not an image Pillow can decode.
+            continue
+
+    return metadata
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def submit_extract_metadata(
+    file: BinaryIO, storage: BaseStorage, name: str
+) -> "Future[ImageMetadata]":
+    """
+    Extract the metadata of an image written to the storage as `name`
+    in a shared process pool, so images are never decoded in the calling thread.
+    Images of `FileSystemStorage` are read by the worker from their path,
+    otherwise the contents of `file` are sent to the worker.
+    """
+
+    if isinstance(storage, FileSystemStorage):
+        return _get_executor().submit(_extract_path, storage.get_path(name))
+
+    file.seek(0)
+    return _get_executor().submit(extract_metadata, file.read())
+
+
+def _extract_path(path: str) -> ImageMetadata:
+    with open(path, "rb") as file:
+        return describe_sample(sample_image(file))
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Forking copies the whole application into every worker.
+            methods = multiprocessing.get_all_start_methods()
+            method = "forkserver" if "forkserver" in methods else "spawn"
+            _executor = ProcessPoolExecutor(
+                mp_context=multiprocessing.get_context(method)
+            )
+        return _executor
+
+
+def _reset_after_fork() -> None:
+    # The pool of the parent can't be used from a forked process.
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):  # pragma: no cover
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def encode_image_value(name: str, metadata: Optional[ImageMetadata]) -> str:
+    """
+    Encode the image name with its metadata as stored in the column,
+    like `photo.jpg#w=800&h=600&o=1&bh=...&c=...`.
+    """
+
+    if metadata is None:
+        return name
+
+    fragment = urlencode(
+        {
+            "w": metadata.width,
+            "h": metadata.height,
+            "o": metadata.orientation,
+            "bh": metadata.blurhash,
+            "c": metadata.dominant_color,
+        }
+    )
+    return f"{name}#{fragment}"
+
+
+def decode_image_value(value: str) -> Tuple[str, Optional[ImageMetadata]]:
+    """
+    Split a column value into the image name and its metadata, if stored.
+    """
+
+    name, separator, fragment = value.rpartition("#")
+    if not separator:
+        return value, None
+
+    params = dict(parse_qsl(fragment))
+    try:
+        metadata = ImageMetadata(
+            width=int(params["w"]),
+            height=int(params["h"]),
+            orientation=int(params["o"]),
+            blurhash=params["bh"],
+            dominant_color=params["c"],
+        )
+    except (KeyError, ValueError):
+        return value, None
+
+    return name, metadata
+
+
+def get_image_metadata(image: StorageImage) -> Optional[ImageMetadata]:
+    """
+    Get the extracted metadata of a `StorageImage`, if any.
+    """
+
+    if image.blurhash is None or image.dominant_color is None:
+        return None
+
+    return ImageMetadata(
+        width=image.width,
+        height=image.height,
+        orientation=image.orientation,
+        blurhash=image.blurhash,
+        dominant_color=image.dominant_color,
+    )
+
+
+def create_storage_image(
+    name: str, storage: BaseStorage, metadata: ImageMetadata
+) -> StorageImage:
+    """
+    Create a `StorageImage` from extracted metadata without reading the image.
+    """
+
+    return StorageImage(
+        name=name,
+        storage=storage,
+        height=metadata.height,
+        width=metadata.width,
+        orientation=metadata.orientation,
+        blurhash=metadata.blurhash,
+        dominant_color=metadata.dominant_color,
+    )
+
+
+def encode_blurhash(
+    pixels: Sequence[Tuple[int, int, int]],
+    width: int,
+    height: int,
+    x_components: int = 4,
+    y_components: int = 3,
+) -> str:
+    """
+    Encode RGB pixels in row order as a BlurHash string.
+    """
+
+    linear = [tuple(_srgb_to_linear(channel) for channel in pixel) for pixel in pixels]
+    factors: List[Tuple[float, float, float]] = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+
+            scale = normalisation / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    blurhash = _encode_base83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(value) for factor in ac for value in factor)
+        quantised_max = max(0, min(82, int(math.floor(actual_max * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+        blurhash += _encode_base83(quantised_max, 1)
+    else:
+        max_value = 1
+        blurhash += _encode_base83(0, 1)
+
+    dc_value = (
+        (_linear_to_srgb(dc[0]) << 16)
+        + (_linear_to_srgb(dc[1]) << 8)
+        + _linear_to_srgb(dc[2])
+    )
+    blurhash += _encode_base83(dc_value, 4)
+
+    for factor in ac:
+        r, g, b = (
+            max(0, min(18, int(math.floor(_sign_pow(v / max_value, 0.5) * 9 + 9.5))))
+            for v in factor
+        )
+        blurhash += _encode_base83(r * 19 * 19 + g * 19 + b, 2)
+
+    return blurhash
+
+
+def _get_dominant_color(image: "Image.Image") -> str:
+    quantized = image.quantize(colors=8)
+    palette = quantized.getpalette() or []
+    colors = quantized.getcolors() or [(1, 0)]
+    _, index = max(colors)
+    start = cast(int, index) * 3
+    r, g, b = palette[start : start + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def _encode_base83(value: int, length: int) -> str:
+    return "".join(
+        _BASE83[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1)
+    )
+
+
+def _srgb_to_linear(value: int) -> float:
+    v = value / 255
+    if v <= 0.04045:
+        return v / 12.92
+    return ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value: float, exponent: float) -> float:
+    return math.copysign(abs(value) ** exponent, value)
+
+
+if PIL:
+    _ORIENTATION_TRANSPOSE = {
+        2: Image.Transpose.FLIP_LEFT_RIGHT,
+        3: Image.Transpose.ROTATE_180,
+        4: Image.Transpose.FLIP_TOP_BOTTOM,
+        5: Image.Transpose.TRANSPOSE,
+        6: Image.Transpose.ROTATE_270,
+        7: Image.Transpose.TRANSVERSE,
+        8: Image.Transpose.ROTATE_90,
+    }
+else:  # pragma: no cover
+    _ORIENTATION_TRANSPOSE = {}
@@ -0,0 +1,240 @@
+import asyncio
+import io
+import queue
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # pragma: no cover
+    try:
+        import multipart  # type: ignore[no-redef]
+        from multipart.multipart import (  # type: ignore[no-redef]
+            parse_options_header,
+        )
+    except ImportError:
+        multipart = None  # type: ignore
+        parse_options_header = None  # type: ignore
+
+from fastapi_storages.base import BaseStorage, StorageFile
+from fastapi_storages.exceptions import ValidationException
+
+_aborted = object()
+
+
+class _Pipe:
+    """
+    Blocking file-like reader fed with chunks from the event loop,
+    used to hand request data to a storage writing in a thread.
+    Feeding waits on the event loop for free space, so a reader thread
+    never depends on another thread to be fed.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = 8) -> None:
+        self._loop = loop
+        self._maxsize = maxsize
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._space = asyncio.Event()
+        self._buffer = bytearray()
+        self._position = 0
+        self._eof = False
+        self._closed = False
+
+    async def feed(self, chunk: Any) -> None:
+        while not self._closed:
+            # Cleared before checking, so a read in between sets it again.
+            self._space.clear()
+            if self._queue.qsize() < self._maxsize:
+                self._queue.put(chunk)
+                return
+            await self._space.wait()
+
+    def close(self) -> None:
+        self._closed = True
+        self._notify()
+
+    def _notify(self) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._space.set)
+        except RuntimeError:  # pragma: no cover
+            # The event loop is closed, nothing is feeding anymore.
+            pass
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = self._queue.get()
+            self._notify()
+            if chunk is _aborted:
+                raise OSError("Upload was aborted")
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer += chunk
+
+        if size < 0:
+            size = len(self._buffer)
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self._position += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if offset == 0 and whence == 0 and self._position == 0:
+            return 0
+        raise io.UnsupportedOperation("seek")
+
+    def seekable(self) -> bool:
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+
+class _Part:
+    def __init__(self) -> None:
+        self.headers: Dict[bytes, bytes] = {}
+        self.field_name = ""
+        self.filename: Optional[str] = None
+        self.data = bytearray()
+        self.pipe: Optional[_Pipe] = None
+        self.future: "Optional[asyncio.Future[str]]" = None
+        self.file: Optional[StorageFile] = None
+
+
+async def ingest_multipart(
+    request: Any, storage: BaseStorage, max_field_size: int = 1024 * 1024
+) -> List[Tuple[str, Union[str, StorageFile, None]]]:
+    """
+    Parse a `multipart/form-data` request while it is being received and
+    stream every file part directly into the storage,
+    without spooling the request body to a temporary file first.
+
+    Returns the `(field name, value)` pairs of the form in order.
+    Files are returned as `StorageFile` values which `FileType` stores as is,
+    other fields as strings. File fields submitted without a file are `None`.
+    Requires `python-multipart` to be installed.
+
+    ???+ usage
+        ```python
+        @app.post("/upload/")
+        async def create_upload_file(request: Request):
+            form = dict(await ingest_multipart(request, storage))
+            example = Example(file=form["file"])
+            ...
+        ```
+    """
+
+    assert multipart is not None, "'python-multipart' package is required."
+
+    content_type, params = parse_options_header(request.headers["content-type"])
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise ValidationException("Request is not multipart/form-data")
+
+    loop = asyncio.get_running_loop()
+    events: List[Tuple[str, bytes]] = []
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.extend(data[start:end])
+
+    def on_header_end() -> None:
+        events.append(("header", bytes(header_field) + b"\x00" + bytes(header_value)))
+        header_field.clear()
+        header_value.clear()
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        events.append(("data", data[start:end]))
+
+    parser = multipart.MultipartParser(
+        params[b"boundary"],
+        {
+            "on_part_begin": lambda: events.append(("begin", b"")),
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": lambda: events.append(("headers", b"")),
+            "on_part_data": on_part_data,
+            "on_part_end": lambda: events.append(("end", b"")),
+        },
+    )
+
+    items: List[Tuple[str, Union[str, StorageFile, None]]] = []
+    part = _Part()
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for event, data in events:
+                if event == "begin":
+                    part = _Part()
+                elif event == "header":
+                    field, _, value = data.partition(b"\x00")
+                    part.headers[field.lower()] = value
+                elif event == "headers":
+                    _start_part(part, storage, loop)
+                elif event == "data":
+                    if part.pipe is not None and part.future is not None:
+                        if part.future.done():
+                            # Writing failed, raise the error without reading on.
+                            await part.future
+                        await part.pipe.feed(data)
+                    elif part.filename is None:
+                        part.data.extend(data)
+                        if len(part.data) > max_field_size:
+                            raise ValidationException("Form field is too large")
+                elif event == "end":
+                    items.append((part.field_name, await _end_part(part)))
+            events.clear()
+
+        parser.finalize()
+    except BaseException:
+        if part.pipe is not None and part.future is not None:
+            await part.pipe.feed(_aborted)
+            await asyncio.gather(part.future, return_exceptions=True)
+        raise
+
+    return items
+
+
+def _start_part(
+    part: _Part, storage: BaseStorage, loop: asyncio.AbstractEventLoop
+) -> None:
+    disposition = part.headers.get(b"content-disposition", b"")
+    _, options = parse_options_header(disposition)
+    part.field_name = options.get(b"name", b"").decode("latin-1")
+
+    if b"filename" not in options:
+        return
+
+    part.filename = options[b"filename"].decode("latin-1")
+    if not part.filename:
+        return
+
+    pipe = _Pipe(loop)
+    file = StorageFile(name=part.filename, storage=storage)
+
+    def write() -> str:
+        try:
+            return file.write(file=pipe)  # type: ignore[arg-type]
+        finally:
+            pipe.close()
+
+    part.pipe = pipe
+    part.file = file
+    part.future = loop.run_in_executor(None, write)
+
+
+async def _end_part(part: _Part) -> Union[str, StorageFile, None]:
+    if part.filename is None:
+        return part.data.decode("utf-8")
+    if part.pipe is None or part.future is None:
+        return None
+
+    await part.pipe.feed(None)
+    await part.future
+    return part.file
@@ -1,6 +1,22 @@
-from typing import Any, Optional
+import time
+from contextlib import closing
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Union,
+    cast,
+)
 
+from sqlalchemy import and_, func, or_, select, type_coerce, update
+from sqlalchemy.engine import CursorResult
 from sqlalchemy.engine.interfaces import Dialect
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ColumnElement
 from sqlalchemy.types import TypeDecorator, Unicode
 
 try:
@@ -10,8 +26,23 @@ try:
 except ImportError:  # pragma: no cover
     PIL = False
 
-from fastapi_storages.base import BaseStorage, StorageFile, StorageImage
+from fastapi_storages.base import (
+    BaseStorage,
+    FileInfo,
+    StorageFile,
+    StorageImage,
+)
+from fastapi_storages.base import prefetch_metadata as prefetch_files_metadata
 from fastapi_storages.exceptions import ValidationException
+from fastapi_storages.images import (
+    create_storage_image,
+    decode_image_value,
+    encode_image_value,
+    extract_metadata_many,
+    get_image_metadata,
+    submit_extract_metadata,
+)
+from fastapi_storages.utils import chunked, limit_file, validate_stored_file
 
 
 class FileType(TypeDecorator):
@@ -34,22 +65,60 @@ class FileType(TypeDecorator):
     impl = Unicode
     cache_ok = True
 
-    def __init__(self, storage: BaseStorage, *args: Any, **kwargs: Any) -> None:
+    def __init__(
+        self,
+        storage: BaseStorage,
+        *args: Any,
+        max_size: Optional[int] = None,
+        allowed_content_types: Optional[Sequence[str]] = None,
+        **kwargs: Any,
+    ) -> None:
         self.storage = storage
+        self.max_size = max_size
+        self.allowed_content_types = (
+            tuple(allowed_content_types) if allowed_content_types else None
+        )
         super().__init__(*args, **kwargs)
 
     def process_bind_param(self, value: Any, dialect: Dialect) -> Optional[str]:
         if value is None:
             return value
+        if isinstance(value, StorageFile):
+            # Stored without the limits of this column, like by `ingest_multipart`.
+            validate_stored_file(value, self.max_size, self.allowed_content_types)
+            return value.name
+        if isinstance(value, str):
+            return value
         if len(value.file.read(1)) != 1:
             return None
 
         file = StorageFile(name=value.filename, storage=self.storage)
-        file.write(file=value.file)
+        file.write(
+            file=limit_file(value.file, self.max_size, self.allowed_content_types)
+        )
 
         value.file.close()
         return file.name
 
+    def write_many(
+        self, values: Iterable[Any], max_workers: int = 8
+    ) -> List[Union[StorageFile, Exception]]:
+        """
+        Store many upload files concurrently,
+        for example before `session.bulk_save_objects`.
+        The returned `StorageFile` objects can be assigned to the column as is.
+        Failed uploads are returned as exceptions in place of the file.
+        """
+
+        files = (
+            (
+                limit_file(value.file, self.max_size, self.allowed_content_types),
+                value.filename,
+            )
+            for value in values
+        )
+        return self.storage.write_many(files, max_workers=max_workers)
+
     def process_result_value(
         self, value: Any, dialect: Dialect
     ) -> Optional[StorageFile]:
@@ -75,20 +144,47 @@ class ImageType(TypeDecorator):
             id = Column(Integer, primary_key=True)
             image = Column(ImageType(storage=FileSystemStorage(path="/tmp")))
         ```
+
+    With `metadata=True` the EXIF orientation, a BlurHash placeholder and
+    the dominant color are extracted in a process pool when the image is written
+    and stored in the column after the name, like `image.png#w=800&h=600&...`.
+    `StorageImage` then exposes them without reading the image.
+    The metadata adds up to about 120 characters to the name,
+    so a length set on the column should leave room for it.
     """
 
     impl = Unicode
     cache_ok = True
 
-    def __init__(self, storage: BaseStorage, *args: Any, **kwargs: Any) -> None:
+    def __init__(
+        self,
+        storage: BaseStorage,
+        *args: Any,
+        max_size: Optional[int] = None,
+        allowed_content_types: Optional[Sequence[str]] = None,
+        metadata: bool = False,
+        **kwargs: Any,
+    ) -> None:
         assert PIL is True, "'Pillow' package is required."
 
         self.storage = storage
+        self.max_size = max_size
+        self.allowed_content_types = (
+            tuple(allowed_content_types) if allowed_content_types else None
+        )
+        self.metadata = metadata
         super().__init__(*args, **kwargs)
 
     def process_bind_param(self, value: Any, dialect: Dialect) -> Optional[str]:
         if value is None:
             return value
+        if isinstance(value, StorageImage):
+            return encode_image_value(value.name, get_image_metadata(value))
+        if isinstance(value, StorageFile):
+            self._validate_stored_image(value)
+            return value.name
+        if isinstance(value, str):
+            return value
         if len(value.file.read(1)) != 1:
             return None
 
@@ -104,11 +200,27 @@ class ImageType(TypeDecorator):
             height=image_file.height,
             width=image_file.width,
         )
-        image.write(file=value.file)
+        image.write(
+            file=limit_file(value.file, self.max_size, self.allowed_content_types)
+        )
+
+        metadata = None
+        if self.metadata:
+            future = submit_extract_metadata(value.file, self.storage, image.name)
+            metadata = future.result()
 
         image_file.close()
         value.file.close()
-        return image.name
+        return encode_image_value(image.name, metadata)
+
+    def _validate_stored_image(self, file: StorageFile) -> None:
+        # Stored without the checks of this column, like by `ingest_multipart`.
+        validate_stored_file(file, self.max_size, self.allowed_content_types)
+        try:
+            with closing(file.open()) as source, Image.open(source) as image_file:
+                image_file.verify()
+        except UnidentifiedImageError:
+            raise ValidationException("Invalid image file")
 
     def process_result_value(
         self, value: Any, dialect: Dialect
@@ -116,7 +228,146 @@ class ImageType(TypeDecorator):
         if value is None:
             return value
 
-        with Image.open(self.storage.get_path(value)) as image:
+        name, metadata = decode_image_value(value)
+        if metadata is not None:
+            return create_storage_image(name, self.storage, metadata)
+
+        with Image.open(self.storage.get_path(name)) as image:
             return StorageImage(
-                name=value, storage=self.storage, height=image.height, width=image.width
+                name=name, storage=self.storage, height=image.height, width=image.width
+            )
+
+
+def find_orphans(
+    session: Session,
+    column: Any,
+    prefix: str = "",
+    batch_size: int = 1000,
+    older_than: float = 60 * 60,
+) -> Iterator[FileInfo]:
+    """
+    Find files in the storage of a `FileType` or `ImageType` column
+    which are not referenced by any row.
+
+    The storage listing is streamed and looked up in the database in batches,
+    so neither the files nor the rows are loaded into memory at once.
+
+    Files are stored before their row is committed, so only files modified
+    more than `older_than` seconds ago are considered, one hour by default.
+    Uploads taking longer to be committed, like slow resumable uploads,
+    need a larger value.
+
+    ???+ usage
+        ```python
+        from fastapi_storages.integrations.sqlalchemy import find_orphans
+
+        with Session(engine) as session:
+            for file in find_orphans(session, Example.file):
+                Example.file.type.storage.delete(file.name)
+        ```
+    """
+
+    storage = column.type.storage
+    value = type_coerce(column, Unicode)
+
+    cutoff = time.time() - older_than
+    listing = (file for file in storage.iter_files(prefix) if file.mtime < cutoff)
+    for files in chunked(listing, batch_size):
+        names = [file.name for file in files]
+        conditions: List[ColumnElement[bool]] = [value.in_(names)]
+        if isinstance(column.type, ImageType):
+            # Values may have the image metadata after the name. Their prefixes
+            # are compared per name length, so there are few conditions per query.
+            for length, group in _group_by_length(names).items():
+                conditions.append(
+                    and_(
+                        func.substr(value, length + 1, 1) == "#",
+                        func.substr(value, 1, length).in_(group),
+                    )
+                )
+
+        stmt = select(value).where(or_(*conditions))
+        existing = {
+            decode_image_value(row)[0] for row in session.execute(stmt).scalars()
+        }
+
+        for file in files:
+            if file.name not in existing:
+                yield file
+
+
+def _group_by_length(names: Iterable[str]) -> Dict[int, List[str]]:
+    groups: Dict[int, List[str]] = {}
+    for name in names:
+        groups.setdefault(len(name), []).append(name)
+    return groups
+
+
+def prefetch_metadata(
+    instances: Iterable[Any], column: Any, max_workers: int = 8
+) -> None:
+    """
+    Fetch the metadata of the files of a `FileType` or `ImageType` column
+    for all loaded instances in one batch,
+    instead of one request per instance when reading `size`.
+
+    ???+ usage
+        ```python
+        from fastapi_storages.integrations.sqlalchemy import prefetch_metadata
+
+        examples = session.query(Example).all()
+        prefetch_metadata(examples, Example.file)
+        ```
+    """
+
+    files = [getattr(instance, column.key) for instance in instances]
+    prefetch_files_metadata(files, max_workers=max_workers)
+
+
+def backfill_image_metadata(
+    session: Session, column: Any, batch_size: int = 100, max_workers: int = 8
+) -> int:
+    """
+    Extract the metadata of existing images of an `ImageType` column
+    which were stored without it. Images are downloaded concurrently and
+    decoded in a process pool. Returns the number of updated rows,
+    the session should be committed afterwards.
+
+    ???+ usage
+        ```python
+        from fastapi_storages.integrations.sqlalchemy import backfill_image_metadata
+
+        with Session(engine) as session:
+            backfill_image_metadata(session, Example.image)
+            session.commit()
+        ```
+    """
+
+    storage = column.type.storage
+    value = type_coerce(column, Unicode)
+    updated = 0
+    last = ""
+
+    while True:
+        stmt = (
+            select(value)
+            .where(value > last, ~value.contains("#", autoescape=True))
+            .distinct()
+            .order_by(value)
+            .limit(batch_size)
+        )
+        names = list(session.execute(stmt).scalars())
+        if not names:
+            return updated
+
+        last = names[-1]
+        metadata = extract_metadata_many(storage, names, max_workers=max_workers)
+        for name, image_metadata in metadata.items():
+            update_stmt = (
+                update(column.class_)
+                .where(value == name)
+                .values({column: encode_image_value(name, image_metadata)})
+                .execution_options(synchronize_session=False)
             )
+            result = cast(CursorResult, session.execute(update_stmt))
+            updated += result.rowcount
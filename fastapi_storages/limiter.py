@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
+
+PRIORITIES = ("interactive", "bulk")
+
+THROTTLING_ERROR_CODES = {
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "TooManyRequests",
+    "TooManyRequestsException",
+}
+
+
+class ConcurrencyLimiter:
+    """
+    Adaptive limit of concurrent requests using an AIMD policy.
+
+    The limit is multiplied by `backoff` when requests are throttled,
+    at most once per `backoff_interval` seconds, and grows by one
+    for every `limit` requests completing without throttling, up to `max_limit`.
+
+    Requests have a priority lane, `interactive` requests are started before
+    waiting `bulk` requests and `bulk` requests use at most `bulk_share`
+    of the limit, so interactive requests are not queued behind a batch job.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        backoff: float = 0.5,
+        backoff_interval: float = 1.0,
+        bulk_share: float = 0.5,
+    ) -> None:
+        assert 1 <= min_limit <= max_limit, "Limits should be 1 <= min <= max"
+
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.backoff = backoff
+        self.backoff_interval = backoff_interval
+        self.bulk_share = bulk_share
+
+        self._limit = float(max_limit)
+        self._in_flight = {priority: 0 for priority in PRIORITIES}
+        self._queued = {priority: 0 for priority in PRIORITIES}
+        self._throttled = 0
+        self._last_backoff = float("-inf")
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """Current number of requests allowed to run concurrently."""
+
+        return int(self._limit)
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Current limit, running and queued requests per lane
+        and the number of throttled responses so far.
+        """
+
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "in_flight": dict(self._in_flight),
+                "queued": dict(self._queued),
+                "throttled": self._throttled,
+            }
+
+    @contextmanager
+    def acquire(self, priority: str = "interactive") -> Iterator[None]:
+        """
+        Wait for a free slot in the priority lane and hold it in the block.
+        """
+
+        assert priority in PRIORITIES, f"Priority should be one of {PRIORITIES}"
+
+        with self._condition:
+            self._queued[priority] += 1
+            try:
+                self._condition.wait_for(lambda: self._can_start(priority))
+            finally:
+                self._queued[priority] -= 1
+            self._in_flight[priority] += 1
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight[priority] -= 1
+                # Requests started before the last backoff don't count as successes.
+                if self._last_backoff < started:
+                    self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                self._condition.notify_all()
+
+    def throttled(self) -> None:
+        """
+        Record a throttled response and reduce the limit.
+        """
+
+        with self._condition:
+            self._throttled += 1
+            now = time.monotonic()
+            if now - self._last_backoff >= self.backoff_interval:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+                self._last_backoff = now
+
+    def _can_start(self, priority: str) -> bool:
+        if sum(self._in_flight.values()) >= self.limit:
+            return False
+        if priority == "bulk":
+            bulk_limit = max(1, int(self._limit * self.bulk_share))
+            return not self._queued["interactive"] and (
+                self._in_flight["bulk"] < bulk_limit
+            )
+        return True
+
+
+_limiters: Dict[Tuple[str, str], ConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(endpoint: str, bucket: str, max_limit: int) -> ConcurrencyLimiter:
+    """
+    Get the limiter shared by all storages using the same bucket.
+    It is created with `max_limit` on first use.
+    """
+
+    with _limiters_lock:
+        key = (endpoint, bucket)
+        if key not in _limiters:
+            _limiters[key] = ConcurrencyLimiter(max_limit)
+        return _limiters[key]
+
+
+def _reset_after_fork() -> None:
+    # Requests in flight in the parent don't exist in the child.
+    global _limiters_lock
+    _limiters.clear()
+    _limiters_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):  # pragma: no cover
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def is_throttled(response: Any) -> bool:
+    """
+    Check if a botocore response passed to `needs-retry` handlers was throttled.
+    """
+
+    if response is None:
+        return False
+
+    http_response, parsed = response
+    code = parsed.get("Error", {}).get("Code")
+    return code in THROTTLING_ERROR_CODES or http_response.status_code == 503
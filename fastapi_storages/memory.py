@@ -0,0 +1,164 @@
+import io
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from fastapi_storages.base import BaseStorage, FileInfo
+from fastapi_storages.exceptions import ValidationException
+from fastapi_storages.utils import limit_file, secure_filename
+
+
+class MemoryStorage(BaseStorage):
+    """
+    In-memory storage which keeps files in a dictionary.
+    Useful for tests or as a fast storage for small and frequently used files.
+
+    With `max_bytes` the least recently used files are evicted
+    once the total size exceeds the budget. All operations are thread-safe.
+    """
+
+    default_chunk_size = 64 * 1024
+
+    def __init__(self, max_bytes: Optional[int] = None) -> None:
+        self._max_bytes = max_bytes
+        self._files: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_name(self, name: str) -> str:
+        """
+        Get the normalized name of the file.
+        """
+
+        filename = secure_filename(Path(name).name)
+        return str(Path(name).with_name(filename))
+
+    def get_path(self, name: str) -> str:
+        """
+        Get the URL of the file in memory.
+        """
+
+        return f"memory://{self.get_name(name)}"
+
+    def get_size(self, name: str) -> int:
+        """
+        Get file size in bytes.
+        """
+
+        return len(self._get(name))
+
+    def get_metadata(self, name: str) -> FileInfo:
+        """
+        Get the file size and modification time.
+        """
+
+        key = self.get_name(name)
+        with self._lock:
+            try:
+                data, mtime = self._files[key]
+            except KeyError:
+                raise FileNotFoundError(key) from None
+
+        return FileInfo(key, len(data), mtime)
+
+    def open(self, name: str) -> BinaryIO:
+        """
+        Open a file handle of the file.
+        The stored data is shared with the handle and not copied.
+        """
+
+        return io.BytesIO(self._get(name))
+
+    def view(self, name: str) -> memoryview:
+        """
+        Get a read-only view of the file contents without copying.
+        """
+
+        return memoryview(self._get(name))
+
+    def write(self, file: BinaryIO, name: str) -> str:
+        """
+        Write input file which is opened in binary mode to memory.
+        """
+
+        key = self.get_name(name)
+
+        file.seek(0, 0)
+        file = limit_file(file, self.MAX_FILE_SIZE, self.ALLOWED_CONTENT_TYPES)
+        chunks: List[bytes] = []
+        while True:
+            chunk = file.read(self.default_chunk_size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        data = b"".join(chunks)
+
+        if self._max_bytes is not None and len(data) > self._max_bytes:
+            raise ValidationException("File size exceeds the storage budget")
+
+        with self._lock:
+            self._pop(key)
+            self._files[key] = (data, time.time())
+            self._size += len(data)
+
+            while self._max_bytes is not None and self._size > self._max_bytes:
+                self._pop(next(iter(self._files)))
+
+        return key
+
+    def delete(self, name: str) -> None:
+        """
+        Delete the file from memory.
+        """
+
+        key = self.get_name(name)
+        with self._lock:
+            if self._pop(key) is None:
+                raise FileNotFoundError(key)
+
+    def generate_new_filename(self, filename: str) -> str:
+        key = self.get_name(filename)
+        stem = Path(filename).stem
+        suffix = Path(filename).suffix
+        counter = 0
+
+        with self._lock:
+            while key in self._files:
+                counter += 1
+                filename = f"{stem}_{counter}{suffix}"
+                key = self.get_name(filename)
+
+        return filename
+
+    def iter_files(self, prefix: str = "") -> Iterator[FileInfo]:
+        """
+        Iterate over a snapshot of the stored files whose name starts with `prefix`.
+        """
+
+        with self._lock:
+            files = list(self._files.items())
+
+        for key, (data, mtime) in files:
+            if key.startswith(prefix):
+                yield FileInfo(key, len(data), mtime)
+
+    def _get(self, name: str) -> bytes:
+        key = self.get_name(name)
+        with self._lock:
+            try:
+                data, _ = self._files[key]
+            except KeyError:
+                raise FileNotFoundError(key) from None
+
+            self._files.move_to_end(key)
+            return data
+
+    def _pop(self, key: str) -> Optional[bytes]:
+        item = self._files.pop(key, None)
+        if item is None:
+            return None
+
+        self._size -= len(item[0])
+        return item[0]
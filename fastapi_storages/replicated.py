@@ -0,0 +1,448 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import (
+    IO,
+    BinaryIO,
+    Callable,
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    cast,
+)
+
+from fastapi_storages.base import BaseStorage, FileInfo
+from fastapi_storages.utils import limit_file
+
+T = TypeVar("T")
+
+
+class _SpoolReader:
+    """
+    Independent reader over a shared spooled file,
+    so every replica can consume the same data at its own pace.
+    """
+
+    def __init__(self, spool: IO[bytes], lock: threading.Lock) -> None:
+        self._spool = spool
+        self._lock = lock
+        self._position = 0
+
+    def read(self, size: int = -1) -> bytes:
+        with self._lock:
+            self._spool.seek(self._position)
+            chunk = self._spool.read(size)
+
+        self._position += len(chunk)
+        return chunk
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence == os.SEEK_END:
+            with self._lock:
+                offset += self._spool.seek(0, os.SEEK_END)
+        elif whence == os.SEEK_CUR:
+            offset += self._position
+
+        self._position = offset
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+
+class ReplicatedStorage(BaseStorage):
+    """
+    Composite storage which keeps the same files in several storages.
+
+    Writes and deletes are sent to all replicas in parallel and return
+    once `write_quorum` of them succeeded, a majority by default.
+    The remaining replicas finish in the background and replicas which
+    missed a write are repaired in the background by copying the file
+    from a healthy replica.
+
+    Reads go to the replica with the lowest observed latency,
+    tracked as an exponentially weighted moving average,
+    and fail over to the next replica on errors.
+    Every `probe_interval` reads the replica read least recently is tried
+    first, so replicas recover from failures and slow periods.
+    Names and paths are taken from the first storage, the primary,
+    and writes fail if the primary fails or a replica stores another name.
+
+    ???+ usage
+        ```python
+        storage = ReplicatedStorage(
+            [S3Storage(), MinioStorage(), FileSystemStorage(path="/mirror")],
+            write_quorum=2,
+        )
+        ```
+    """
+
+    default_spool_size = 8 * 1024 * 1024
+    """Files larger than this are spooled to disk while being replicated."""
+
+    latency_smoothing = 0.2
+    """Weight of the latest sample in the latency moving average."""
+
+    failure_penalty = 1.0
+    """Seconds added to the latency sample of a failed read."""
+
+    probe_interval = 100
+    """Number of reads after which the replica read least recently is tried first."""
+
+    def __init__(
+        self,
+        storages: Sequence[BaseStorage],
+        write_quorum: Optional[int] = None,
+        max_workers: int = 8,
+    ) -> None:
+        assert storages, "At least one storage is required"
+
+        self.storages = list(storages)
+        self.write_quorum = write_quorum or len(self.storages) // 2 + 1
+        assert (
+            1 <= self.write_quorum <= len(self.storages)
+        ), "write_quorum should be between 1 and the number of storages"
+
+        self.OVERWRITE_EXISTING_FILES = self.storages[0].OVERWRITE_EXISTING_FILES
+
+        self.latencies: List[float] = [0.0] * len(self.storages)
+        """Moving average of the read latency of each replica in seconds."""
+
+        self._sampled_at: List[float] = [0.0] * len(self.storages)
+        self._reads = 0
+
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._background: "Set[Future[None]]" = set()
+        self._pending_repairs: Dict[str, Set[int]] = {}
+
+    @property
+    def primary(self) -> BaseStorage:
+        return self.storages[0]
+
+    def get_name(self, name: str) -> str:
+        """
+        Get the normalized name of the file from the primary.
+        """
+
+        return self.primary.get_name(name)
+
+    def get_path(self, name: str) -> str:
+        """
+        Get the full path of the file from the primary.
+        """
+
+        return self.primary.get_path(name)
+
+    def get_size(self, name: str) -> int:
+        """
+        Get file size in bytes from the fastest replica.
+        """
+
+        return self._read(lambda storage: storage.get_size(name))
+
+    def get_metadata(self, name: str) -> FileInfo:
+        """
+        Get the file metadata from the fastest replica.
+        """
+
+        return self._read(lambda storage: storage.get_metadata(name))
+
+    def open(self, name: str) -> BinaryIO:
+        """
+        Open a file handle of the file from the fastest replica.
+        """
+
+        return self._read(lambda storage: storage.open(name))
+
+    def view(self, name: str) -> memoryview:
+        """
+        Get a read-only view of the file contents from the fastest replica.
+        """
+
+        return self._read(lambda storage: storage.view(name))
+
+    def write(self, file: BinaryIO, name: str) -> str:
+        """
+        Write input file to all replicas and wait for the write quorum.
+        The input is read only once and spooled for the replicas.
+        """
+
+        file.seek(0, 0)
+        # The limits of all replicas are checked before anything is written.
+        for storage in [self, *self.storages]:
+            file = limit_file(
+                file, storage.MAX_FILE_SIZE, storage.ALLOWED_CONTENT_TYPES
+            )
+
+        spool = tempfile.SpooledTemporaryFile(max_size=self.default_spool_size)
+        try:
+            shutil.copyfileobj(file, spool)
+        except BaseException:
+            spool.close()
+            raise
+
+        spool_lock = threading.Lock()
+        primary = self._submit(
+            self.primary.write, cast(BinaryIO, _SpoolReader(spool, spool_lock)), name
+        )
+
+        def write_replica(storage: BaseStorage, reader: BinaryIO) -> str:
+            written = storage.write(reader, name)
+            # Submitted after the primary, so it is already running.
+            self._check_name(storage, written, primary.result())
+            return written
+
+        futures = {primary: 0}
+        for index, storage in enumerate(self.storages[1:], 1):
+            reader = cast(BinaryIO, _SpoolReader(spool, spool_lock))
+            futures[self._submit(write_replica, storage, reader)] = index
+
+        def finished() -> None:
+            spool.close()
+            failed = {index for future, index in futures.items() if future.exception()}
+            # Failed writes are only repaired if the write itself succeeded.
+            if len(failed) <= len(self.storages) - self.write_quorum:
+                self._schedule_repair(primary.result(), failed)
+
+        self._when_all_done(list(futures), finished)
+        self._wait_for_quorum(futures)
+
+        return primary.result()
+
+    def delete(self, name: str) -> None:
+        """
+        Delete the file from all replicas and wait for the write quorum.
+        Replicas which don't have the file count as deleted.
+        """
+
+        with self._lock:
+            self._pending_repairs.pop(name, None)
+
+        def delete(storage: BaseStorage) -> bool:
+            try:
+                storage.delete(name)
+            except FileNotFoundError:
+                return False
+            return True
+
+        futures = {
+            self._submit(delete, storage): index
+            for index, storage in enumerate(self.storages)
+        }
+        self._wait_for_quorum(futures)
+
+        deleted = [
+            future.result()
+            for future in futures
+            if future.done() and future.exception() is None
+        ]
+        if not any(deleted):
+            raise FileNotFoundError(self.get_name(name))
+
+    def generate_new_filename(self, filename: str) -> str:
+        return self.primary.generate_new_filename(filename)
+
+    def iter_files(self, prefix: str = "") -> Iterator[FileInfo]:
+        """
+        Iterate over the files of the primary whose name starts with `prefix`.
+        """
+
+        return self.primary.iter_files(prefix)
+
+    def repair(self) -> int:
+        """
+        Retry copying files to the replicas which missed a write.
+        Returns the number of repaired replicas.
+        """
+
+        with self._lock:
+            pending = [(name, set(i)) for name, i in self._pending_repairs.items()]
+
+        return sum(self._repair(name, indexes) for name, indexes in pending)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for the writes and repairs running in the background.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                background = list(self._background)
+            if not background:
+                return
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            for _ in as_completed(background, timeout=remaining):
+                pass
+
+    def _read(self, fn: Callable[[BaseStorage], T], exclude: Collection[int] = ()) -> T:
+        error: Optional[Exception] = None
+        order, probe = self._get_read_order(exclude)
+
+        for index in order:
+            # The estimate of a probed replica is stale, so the sample replaces it.
+            replace, probe = probe, False
+            start = time.monotonic()
+            try:
+                result = fn(self.storages[index])
+            except FileNotFoundError as exc:
+                # The replica may have missed the write, but it responded.
+                self._record_latency(index, time.monotonic() - start, replace)
+                error = error or exc
+            except Exception as exc:
+                self._record_latency(
+                    index, time.monotonic() - start + self.failure_penalty, replace
+                )
+                if error is None or isinstance(error, FileNotFoundError):
+                    error = exc
+            else:
+                self._record_latency(index, time.monotonic() - start, replace)
+                return result
+
+        assert error is not None
+        raise error
+
+    def _get_read_order(self, exclude: Collection[int]) -> Tuple[List[int], bool]:
+        """
+        Get the replicas to read from in order and whether the first one is probed.
+        """
+
+        indexes = [i for i in range(len(self.storages)) if i not in exclude]
+        with self._lock:
+            self._reads += 1
+            order = sorted(indexes, key=lambda i: self.latencies[i])
+            if len(order) < 2 or self._reads % self.probe_interval:
+                return order, False
+
+            stalest = min(order, key=lambda i: self._sampled_at[i])
+
+        order.remove(stalest)
+        return [stalest, *order], True
+
+    def _record_latency(self, index: int, sample: float, replace: bool = False) -> None:
+        with self._lock:
+            latency = self.latencies[index]
+            if latency and not replace:
+                sample = latency + self.latency_smoothing * (sample - latency)
+            self.latencies[index] = sample
+            self._sampled_at[index] = time.monotonic()
+
+    def _check_name(self, storage: BaseStorage, written: str, expected: str) -> None:
+        if written == expected:
+            return
+
+        storage.delete(written)
+        raise ValueError(f"Replica {storage!r} stored {expected!r} as {written!r}")
+
+    def _wait_for_quorum(self, futures: "Dict[Future[T], int]") -> None:
+        succeeded = 0
+        errors: List[BaseException] = []
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as exc:
+                errors.append(exc)
+                if len(errors) > len(futures) - self.write_quorum:
+                    raise errors[0]
+            else:
+                succeeded += 1
+                if succeeded >= self.write_quorum:
+                    return
+
+    def _schedule_repair(self, name: str, indexes: Set[int]) -> None:
+        if not indexes:
+            return
+
+        with self._lock:
+            self._pending_repairs.setdefault(name, set()).update(indexes)
+
+        future = self._submit(self._repair, name, indexes)
+        self._when_all_done([future], lambda: None)
+
+    def _repair(self, name: str, indexes: Set[int]) -> int:
+        def copy(storage: BaseStorage) -> IO[bytes]:
+            spool = tempfile.SpooledTemporaryFile(max_size=self.default_spool_size)
+            with storage.open(name) as file:
+                shutil.copyfileobj(file, spool)
+            return spool
+
+        try:
+            spool = self._read(copy, exclude=indexes)
+        except Exception:
+            return 0
+
+        repaired = 0
+        with spool:
+            for index in sorted(indexes):
+                storage = self.storages[index]
+                try:
+                    self._check_name(
+                        storage, storage.write(cast(BinaryIO, spool), name), name
+                    )
+                except Exception:
+                    continue
+
+                repaired += 1
+                with self._lock:
+                    pending = self._pending_repairs.get(name, set())
+                    pending.discard(index)
+                    if not pending:
+                        self._pending_repairs.pop(name, None)
+
+        return repaired
+
+    def _submit(self, fn: Callable[..., T], *args: object) -> "Future[T]":
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="replicated"
+                )
+            executor = self._executor
+
+        return executor.submit(fn, *args)
+
+    def _when_all_done(
+        self, futures: "List[Future[T]]", fn: Callable[[], None]
+    ) -> None:
+        """
+        Run `fn` once all futures are done and track it as background work.
+        """
+
+        remaining = [len(futures)]
+        done: "Future[None]" = Future()
+        with self._lock:
+            self._background.add(done)
+
+        def callback(_: "Future[T]") -> None:
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+
+            try:
+                fn()
+            finally:
+                with self._lock:
+                    self._background.discard(done)
+                done.set_result(None)
+
+        for future in futures:
+            future.add_done_callback(callback)
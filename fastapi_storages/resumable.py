@@ -0,0 +1,439 @@
+import json
+import mimetypes
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from fastapi_storages.base import BaseStorage, StorageFile
+from fastapi_storages.exceptions import ValidationException
+from fastapi_storages.filesystem import FileSystemStorage, _fdatasync
+from fastapi_storages.s3 import S3Storage
+from fastapi_storages.utils import validate_content_type, validate_size
+
+
+class UploadSession:
+    """
+    State of a resumable upload.
+    """
+
+    def __init__(
+        self,
+        *,
+        id: str,
+        name: str,
+        size: Optional[int],
+        expires_at: float,
+        offset: int = 0,
+        parts: Optional[Dict[int, str]] = None,
+        upload_id: str = "",
+    ) -> None:
+        self.id = id
+        """Unique ID of the upload session."""
+
+        self.name = name
+        """Name the file is stored with when the upload is finished."""
+
+        self.size = size
+        """Total size in bytes, if declared when the upload was created."""
+
+        self.expires_at = expires_at
+        """Unix timestamp after which the upload is discarded."""
+
+        self.offset = offset
+        """Number of bytes received."""
+
+        self.parts = parts or {}
+        """Uploaded S3 part numbers with their ETags."""
+
+        self.upload_id = upload_id
+        """S3 multipart upload ID."""
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "size": self.size,
+            "expires_at": self.expires_at,
+            "offset": self.offset,
+            "parts": {str(number): etag for number, etag in self.parts.items()},
+            "upload_id": self.upload_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UploadSession":
+        data = dict(data)
+        data["parts"] = {int(number): etag for number, etag in data["parts"].items()}
+        return cls(**data)
+
+
+class BaseSessionStore:  # pragma: no cover
+    """
+    Store keeping the state of upload sessions.
+    """
+
+    def get(self, id: str) -> Optional[UploadSession]:
+        raise NotImplementedError()
+
+    def save(self, session: UploadSession) -> None:
+        raise NotImplementedError()
+
+    def delete(self, id: str) -> None:
+        raise NotImplementedError()
+
+    def __iter__(self) -> Iterator[UploadSession]:
+        raise NotImplementedError()
+
+
+class MemorySessionStore(BaseSessionStore):
+    """
+    Keeps upload sessions in memory of the current process.
+    """
+
+    def __init__(self) -> None:
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+
+    def get(self, id: str) -> Optional[UploadSession]:
+        data = self._sessions.get(id)
+        return UploadSession.from_dict(data) if data is not None else None
+
+    def save(self, session: UploadSession) -> None:
+        self._sessions[session.id] = session.to_dict()
+
+    def delete(self, id: str) -> None:
+        self._sessions.pop(id, None)
+
+    def __iter__(self) -> Iterator[UploadSession]:
+        for data in list(self._sessions.values()):
+            yield UploadSession.from_dict(data)
+
+
+class FileSessionStore(BaseSessionStore):
+    """
+    Keeps upload sessions as JSON files in a local directory,
+    so they survive restarts of the process.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+
+    def get(self, id: str) -> Optional[UploadSession]:
+        try:
+            data = json.loads(self._get_path(id).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+        return UploadSession.from_dict(data)
+
+    def save(self, session: UploadSession) -> None:
+        path = self._get_path(session.id)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(session.to_dict()))
+        os.replace(tmp_path, path)
+
+    def delete(self, id: str) -> None:
+        self._get_path(id).unlink(missing_ok=True)
+
+    def __iter__(self) -> Iterator[UploadSession]:
+        for path in self._path.glob("*.json"):
+            session = self.get(path.stem)
+            if session is not None:
+                yield session
+
+    def _get_path(self, id: str) -> Path:
+        return self._path / f"{uuid.UUID(id).hex}.json"
+
+
+class ResumableUploads:
+    """
+    Resumable chunked uploads for `FileSystemStorage` and `S3Storage`.
+
+    An upload is created first and then receives chunks at byte offsets.
+    The filesystem accepts chunks in order and writes them at their offset
+    into a partial file. S3 accepts chunks in any order as multipart parts,
+    every chunk except the last must be exactly `part_size` bytes.
+    Finishing the upload returns a `StorageFile` which `FileType` stores as is.
+
+    ???+ usage
+        ```python
+        uploads = ResumableUploads(storage=FileSystemStorage(path="/tmp"))
+
+        session = uploads.create("video.mp4", size=size)
+        uploads.write(session.id, chunk, offset=0)
+        ...
+        example = Example(file=uploads.finish(session.id))
+        ```
+    """
+
+    def __init__(
+        self,
+        storage: BaseStorage,
+        store: Optional[BaseSessionStore] = None,
+        expires_in: float = 24 * 60 * 60,
+        part_size: int = 8 * 1024 * 1024,
+    ) -> None:
+        assert isinstance(
+            storage, (FileSystemStorage, S3Storage)
+        ), "Only FileSystemStorage and S3Storage support resumable uploads"
+
+        self.storage = storage
+        self.store = store or MemorySessionStore()
+        self.expires_in = expires_in
+        self.part_size = part_size
+        self._lock = threading.Lock()
+        self._session_locks: Dict[str, threading.Lock] = {}
+
+    def create(self, filename: str, size: Optional[int] = None) -> UploadSession:
+        """
+        Create a new upload session for a file.
+        """
+
+        if size is not None:
+            validate_size(size, self.storage.MAX_FILE_SIZE)
+
+        if self.storage.OVERWRITE_EXISTING_FILES:
+            name = self.storage.get_name(filename)
+        else:
+            name = self.storage.get_name(self.storage.generate_new_filename(filename))
+
+        session = UploadSession(
+            id=str(uuid.uuid4()),
+            name=name,
+            size=size,
+            expires_at=time.time() + self.expires_in,
+        )
+
+        if isinstance(self.storage, S3Storage):
+            content_type, _ = mimetypes.guess_type(name)
+            params = {"ContentType": content_type or self.storage.default_content_type}
+            if self.storage.AWS_DEFAULT_ACL:
+                params["ACL"] = self.storage.AWS_DEFAULT_ACL
+            params.update(self.storage.get_object_parameters(name))
+            response = self.storage._s3.create_multipart_upload(
+                Bucket=self.storage.AWS_S3_BUCKET_NAME, Key=name, **params
+            )
+            session.upload_id = response["UploadId"]
+        else:
+            self._get_partial_path(session).touch()
+
+        self.store.save(session)
+        return session
+
+    def get(self, id: str) -> UploadSession:
+        """
+        Get an upload session which has not expired.
+        """
+
+        session = self.store.get(id)
+        if session is None or session.expired:
+            raise ValidationException("Upload session not found")
+
+        return session
+
+    def write(self, id: str, data: bytes, offset: int) -> UploadSession:
+        """
+        Write a chunk of the file at the given byte offset.
+        """
+
+        session = self.get(id)
+        end = offset + len(data)
+        if session.size is not None and end > session.size:
+            raise ValidationException("Chunk exceeds the declared upload size")
+
+        validate_size(end, self.storage.MAX_FILE_SIZE)
+        if offset == 0:
+            validate_content_type(data, self.storage.ALLOWED_CONTENT_TYPES)
+
+        if isinstance(self.storage, S3Storage):
+            return self._write_part(session, data, offset)
+
+        with self._get_session_lock(session.id):
+            session = self.get(session.id)
+            if offset != session.offset:
+                raise ValidationException(f"Expected chunk at offset {session.offset}")
+
+            self._write_at(self._get_partial_path(session), data, offset)
+            session.offset = end
+            self.store.save(session)
+
+        return session
+
+    def finish(self, id: str) -> StorageFile:
+        """
+        Complete the upload and return the stored file.
+        """
+
+        session = self.get(id)
+        if isinstance(self.storage, S3Storage):
+            self._complete_parts(session)
+        else:
+            if session.size is not None and session.offset != session.size:
+                raise ValidationException("Upload is not complete")
+
+            partial_path = self._get_partial_path(session)
+            path = Path(self.storage.get_path(session.name))
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            if self.storage._durability != "none":
+                fd = os.open(partial_path, os.O_WRONLY)
+                try:
+                    _fdatasync(fd)
+                finally:
+                    os.close(fd)
+
+            os.replace(partial_path, path)
+            if self.storage._durability == "directory":
+                self.storage._sync_directory(path.parent)
+
+        self._delete_session(session.id)
+        return StorageFile(name=session.name, storage=self.storage)
+
+    def abort(self, id: str) -> None:
+        """
+        Abort the upload and discard the received data.
+        """
+
+        session = self.store.get(id)
+        if session is None:
+            return
+
+        if isinstance(self.storage, S3Storage):
+            self.storage._s3.abort_multipart_upload(
+                Bucket=self.storage.AWS_S3_BUCKET_NAME,
+                Key=session.name,
+                UploadId=session.upload_id,
+            )
+        else:
+            self._get_partial_path(session).unlink(missing_ok=True)
+
+        self._delete_session(session.id)
+
+    def cleanup(self) -> int:
+        """
+        Abort all expired uploads. Returns the number of aborted uploads.
+        """
+
+        expired = [session.id for session in self.store if session.expired]
+        for id in expired:
+            self.abort(id)
+
+        return len(expired)
+
+    def _get_session_lock(self, id: str) -> threading.Lock:
+        with self._lock:
+            return self._session_locks.setdefault(id, threading.Lock())
+
+    def _delete_session(self, id: str) -> None:
+        self.store.delete(id)
+        with self._lock:
+            self._session_locks.pop(id, None)
+
+    def _write_at(self, path: Path, data: bytes, offset: int) -> None:
+        if not hasattr(os, "pwrite"):  # pragma: no cover
+            with open(path, "r+b") as file:
+                file.seek(offset)
+                file.write(data)
+            return
+
+        fd = os.open(path, os.O_WRONLY)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.pwrite(fd, view, offset + len(data) - len(view)) :]
+        finally:
+            os.close(fd)
+
+    def _get_partial_path(self, session: UploadSession) -> Path:
+        assert isinstance(self.storage, FileSystemStorage)
+        # Named like temporary files, so listing and resharding skip it.
+        return self.storage._path / f".{session.id}.upload.tmp"
+
+    def _write_part(
+        self, session: UploadSession, data: bytes, offset: int
+    ) -> UploadSession:
+        assert isinstance(self.storage, S3Storage)
+
+        end = offset + len(data)
+        is_last = session.size is None or end == session.size
+        if offset % self.part_size or (len(data) != self.part_size and not is_last):
+            raise ValidationException(
+                f"Chunks should be aligned to parts of {self.part_size} bytes"
+            )
+
+        number = offset // self.part_size + 1
+        with self.storage._acquire():
+            response = self.storage._s3.upload_part(
+                Bucket=self.storage.AWS_S3_BUCKET_NAME,
+                Key=session.name,
+                UploadId=session.upload_id,
+                PartNumber=number,
+                Body=data,
+            )
+
+        with self._get_session_lock(session.id):
+            session = self.get(session.id)
+            if number not in session.parts:
+                session.offset += len(data)
+            if len(data) != self.part_size:
+                # The last part determines the size if it was not declared.
+                session.size = end
+            session.parts[number] = response["ETag"]
+            self.store.save(session)
+
+        return session
+
+    def _complete_parts(self, session: UploadSession) -> None:
+        assert isinstance(self.storage, S3Storage)
+
+        # The session may miss parts written by other processes at the same
+        # time, so the parts are taken from S3 instead.
+        listed = list(self._list_parts(session))
+        if [part["PartNumber"] for part in listed] != list(range(1, len(listed) + 1)):
+            raise ValidationException("Upload is missing parts")
+
+        size = sum(part["Size"] for part in listed)
+        if session.size is not None and size != session.size:
+            raise ValidationException("Upload is not complete")
+
+        if not listed:
+            self.storage._s3.abort_multipart_upload(
+                Bucket=self.storage.AWS_S3_BUCKET_NAME,
+                Key=session.name,
+                UploadId=session.upload_id,
+            )
+            content_type, _ = mimetypes.guess_type(session.name)
+            self.storage._s3.put_object(
+                Bucket=self.storage.AWS_S3_BUCKET_NAME,
+                Key=session.name,
+                Body=b"",
+                ContentType=content_type or self.storage.default_content_type,
+            )
+            return
+
+        parts = [
+            {"PartNumber": part["PartNumber"], "ETag": part["ETag"]} for part in listed
+        ]
+        self.storage._s3.complete_multipart_upload(
+            Bucket=self.storage.AWS_S3_BUCKET_NAME,
+            Key=session.name,
+            UploadId=session.upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+
+    def _list_parts(self, session: UploadSession) -> Iterator[Dict[str, Any]]:
+        assert isinstance(self.storage, S3Storage)
+
+        paginator = self.storage._s3.get_paginator("list_parts")
+        for page in paginator.paginate(
+            Bucket=self.storage.AWS_S3_BUCKET_NAME,
+            Key=session.name,
+            UploadId=session.upload_id,
+        ):
+            yield from page.get("Parts", [])
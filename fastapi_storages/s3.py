@@ -1,15 +1,48 @@
+import functools
+import hashlib
 import mimetypes
+import mmap
 import os
+import threading
+import weakref
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import closing, nullcontext
+from fnmatch import fnmatchcase
 from pathlib import Path
-from typing import BinaryIO
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
 
 try:
     import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
 except ImportError:  # pragma: no cover
     boto3 = None
 
-from fastapi_storages.base import BaseStorage
-from fastapi_storages.utils import secure_filename
+from fastapi_storages.base import BaseStorage, FileInfo
+from fastapi_storages.compression import CompressedFile, decompress, get_encodings
+from fastapi_storages.limiter import ConcurrencyLimiter, get_limiter, is_throttled
+from fastapi_storages.utils import (
+    get_file_size,
+    iter_concurrently,
+    limit_file,
+    secure_filename,
+)
+
+T = TypeVar("T")
 
 
 class S3Storage(BaseStorage):
@@ -20,6 +53,11 @@ class S3Storage(BaseStorage):
     """
 
     default_content_type = "application/octet-stream"
+    default_chunk_size = 64 * 1024
+
+    min_keys_per_list_page = 10
+    """Requested keys needed per listed page in `get_metadata_many`,
+    sparser ranges are requested one object at a time."""
 
     AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID", "")
     """AWS access key ID. Either set here or as an environment variable."""
@@ -46,22 +84,175 @@ class S3Storage(BaseStorage):
     AWS_S3_CUSTOM_DOMAIN = ""
     """Custom domain to use for serving object URLs."""
 
+    AWS_S3_COMPRESSION: Dict[str, str] = {}
+    """Content encoding used to compress objects at rest by content type,
+    like `{"text/*": "gzip", "application/json": "gzip"}`.
+    Objects are served as-is with the `Content-Encoding` header
+    and S3 doesn't negotiate it with clients, so only `gzip` is supported."""
+
+    AWS_S3_OBJECT_PARAMETERS: Dict[str, Any] = {}
+    """Parameters set on every uploaded object, like
+    `{"CacheControl": "max-age=86400", "StorageClass": "STANDARD_IA"}`.
+    See `get_object_parameters` to set them per object."""
+
+    AWS_S3_VERSIONED_KEYS = False
+    """Add a hash of the contents to object keys like `photo.3f2a9c1e0b7d4a65.png`,
+    so the URL changes whenever the contents change and objects can be cached
+    forever. Only applies to inputs which can be read twice."""
+
+    AWS_S3_VERSIONED_CACHE_CONTROL = "public, max-age=31536000, immutable"
+    """Cache-Control set on objects with versioned keys."""
+
+    AWS_S3_RETRY_MODE = ""
+    """Retry mode, one of `legacy`, `standard` or `adaptive`.
+    Uses the botocore default if not set."""
+
+    AWS_S3_MAX_ATTEMPTS = 0
+    """Maximum number of attempts per request including the first one.
+    Uses the botocore default if not set."""
+
+    AWS_S3_CONNECT_TIMEOUT = 60.0
+    """Timeout in seconds for establishing a connection."""
+
+    AWS_S3_READ_TIMEOUT = 60.0
+    """Timeout in seconds for reading from a connection."""
+
+    AWS_S3_THREAD_LOCAL_CLIENT = False
+    """Create a separate client for every thread instead of sharing one."""
+
+    AWS_S3_MAX_CONCURRENCY = 0
+    """Maximum number of concurrent requests to the bucket, shared by all storages
+    using it. The limit is lowered while S3 throttles requests with `SlowDown`
+    and raised again once they succeed. Multipart uploads hold a single slot
+    and send their parts one at a time. Disabled if not set."""
+
+    AWS_S3_PRIORITY = "interactive"
+    """Priority lane used with `AWS_S3_MAX_CONCURRENCY`, `interactive` or `bulk`.
+    Bulk requests wait for interactive ones and use at most half of the limit."""
+
+    AWS_S3_HEDGE_AFTER = 0.0
+    """Seconds to wait for an idempotent read like `get_size` or `open`
+    before sending a duplicate request, using whichever answers first.
+    Disabled if not set."""
+
+    AWS_S3_HEDGE_MAX_WORKERS = 128
+    """Maximum number of threads running hedged reads and their hedges.
+    Threads are started on demand, it should be above the number of reads
+    running at the same time so reads don't wait for each other."""
+
+    AWS_S3_HEDGE_MAX_RATIO = 0.1
+    """Maximum fraction of requests which are hedged, so slow periods
+    don't double the load on S3."""
+
     def __init__(self) -> None:
         assert boto3 is not None, "'boto3' is not installed"
         assert not self.AWS_S3_ENDPOINT_URL.startswith(
             "http"
         ), "URL should not contain protocol"
+        assert all(
+            encoding == "gzip" for encoding in self.AWS_S3_COMPRESSION.values()
+        ), "Only 'gzip' is supported in AWS_S3_COMPRESSION"
 
         self._http_scheme = "https" if self.AWS_S3_USE_SSL else "http"
         self._url = f"{self._http_scheme}://{self.AWS_S3_ENDPOINT_URL}"
-        self._s3 = boto3.client(
+
+        self.hedge_counters = {"requests": 0, "hedged": 0, "hedge_wins": 0}
+        """Number of hedgeable requests, hedges sent and hedges answering first."""
+
+        self._client: Any = None
+        self._client_pid: Optional[int] = None
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._reset()
+        _instances.add(self)
+
+    @property
+    def _s3(self) -> Any:
+        """
+        The boto3 client, created on first use in every process,
+        or in every thread if `AWS_S3_THREAD_LOCAL_CLIENT` is set.
+        """
+
+        pid = os.getpid()
+        if self.AWS_S3_THREAD_LOCAL_CLIENT:
+            if getattr(self._local, "pid", None) != pid:
+                self._local.client = self._create_client()
+                self._local.pid = pid
+            return self._local.client
+
+        if self._client_pid != pid:
+            with self._client_lock:
+                if self._client_pid != pid:
+                    self._client = self._create_client()
+                    self._client_pid = pid
+
+        return self._client
+
+    def _create_client(self) -> Any:
+        retries: Dict[str, Any] = {}
+        if self.AWS_S3_RETRY_MODE:
+            retries["mode"] = self.AWS_S3_RETRY_MODE
+        if self.AWS_S3_MAX_ATTEMPTS:
+            retries["total_max_attempts"] = self.AWS_S3_MAX_ATTEMPTS
+
+        # Sessions are not thread-safe, so every client gets its own.
+        session = boto3.session.Session()
+        client = session.client(
             "s3",
             endpoint_url=self._url,
             use_ssl=self.AWS_S3_USE_SSL,
             aws_access_key_id=self.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=self.AWS_SECRET_ACCESS_KEY,
+            config=Config(
+                retries=retries,
+                connect_timeout=self.AWS_S3_CONNECT_TIMEOUT,
+                read_timeout=self.AWS_S3_READ_TIMEOUT,
+            ),
+        )
+        if self.AWS_S3_MAX_CONCURRENCY:
+            client.meta.events.register("needs-retry.s3", self._on_needs_retry)
+
+        return client
+
+    @property
+    def concurrency_metrics(self) -> Dict[str, Any]:
+        """
+        Current concurrency limit of the bucket with the running
+        and queued requests per priority lane.
+        Empty if `AWS_S3_MAX_CONCURRENCY` is not set.
+        """
+
+        limiter = self._get_limiter()
+        return limiter.metrics if limiter is not None else {}
+
+    def _get_limiter(self) -> Optional[ConcurrencyLimiter]:
+        if not self.AWS_S3_MAX_CONCURRENCY:
+            return None
+
+        return get_limiter(
+            self._url, self.AWS_S3_BUCKET_NAME, self.AWS_S3_MAX_CONCURRENCY
         )
 
+    def _acquire(self) -> ContextManager[None]:
+        limiter = self._get_limiter()
+        if limiter is None:
+            return nullcontext()
+
+        return limiter.acquire(self.AWS_S3_PRIORITY)
+
+    def _on_needs_retry(self, response: Any = None, **kwargs: Any) -> None:
+        limiter = self._get_limiter()
+        if limiter is not None and is_throttled(response):
+            limiter.throttled()
+
+    def _reset(self) -> None:
+        # Clients, locks and threads are not usable after a fork.
+        self._client = None
+        self._client_pid = None
+        self._client_lock = threading.Lock()
+        self._local = threading.local()
+        self._hedge_lock = threading.Lock()
+        self._hedge_executor = None
+
     def get_name(self, name: str) -> str:
         """
         Get the normalized name of the file.
@@ -101,23 +292,203 @@ class S3Storage(BaseStorage):
         """
 
         key = self.get_name(name)
-        return self._s3.head_object(Bucket=self.AWS_S3_BUCKET_NAME, Key=key)[
-            "ContentLength"
+        response = self._hedge(
+            self._s3.head_object, Bucket=self.AWS_S3_BUCKET_NAME, Key=key
+        )
+        if "uncompressed-size" in response["Metadata"]:
+            return int(response["Metadata"]["uncompressed-size"])
+
+        return response["ContentLength"]
+
+    def get_metadata(self, name: str) -> FileInfo:
+        """
+        Get the object size and modification time.
+        """
+
+        key = self.get_name(name)
+        try:
+            response = self._hedge(
+                self._s3.head_object, Bucket=self.AWS_S3_BUCKET_NAME, Key=key
+            )
+        except boto3.exceptions.botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] == "404":
+                raise FileNotFoundError(key) from e
+            raise
+
+        size = response["Metadata"].get("uncompressed-size", response["ContentLength"])
+        return FileInfo(key, int(size), response["LastModified"].timestamp())
+
+    def get_metadata_many(
+        self, names: Iterable[str], max_workers: int = 8
+    ) -> Dict[str, FileInfo]:
+        """
+        Get the metadata of many objects.
+        If the keys share a common prefix, the range of keys between them
+        is listed with `list_objects_v2` while it is dense enough,
+        the remaining objects are requested concurrently.
+        """
+
+        keys = {self.get_name(name): name for name in names}
+        prefix = os.path.commonprefix(list(keys))
+        max_pages = len(keys) // self.min_keys_per_list_page
+        if not max_pages or not prefix or self.AWS_S3_COMPRESSION:
+            # Listings don't include the uncompressed size of objects.
+            return super().get_metadata_many(keys.values(), max_workers=max_workers)
+
+        first, last = min(keys), max(keys)
+        metadata: Dict[str, FileInfo] = {}
+        listed = ""
+        paginator = self._s3.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=self.AWS_S3_BUCKET_NAME, Prefix=prefix, StartAfter=first[:-1]
+        )
+        for number, page in enumerate(pages, 1):
+            for obj in page.get("Contents", []):
+                if obj["Key"] > last:
+                    return metadata
+                if obj["Key"] in keys:
+                    metadata[keys[obj["Key"]]] = FileInfo(
+                        obj["Key"], obj["Size"], obj["LastModified"].timestamp()
+                    )
+                listed = obj["Key"]
+
+            if page.get("IsTruncated") and number >= max_pages:
+                # The range is sparse, requesting the rest directly is cheaper.
+                remaining = [name for key, name in keys.items() if key > listed]
+                metadata.update(
+                    super().get_metadata_many(remaining, max_workers=max_workers)
+                )
+                break
+
+        return metadata
+
+    def open(self, name: str) -> BinaryIO:
+        """
+        Open a streaming handle of the object.
+        Compressed objects are decompressed while reading.
+        """
+
+        key = self.get_name(name)
+        response = self._hedge(
+            self._s3.get_object,
+            Bucket=self.AWS_S3_BUCKET_NAME,
+            Key=key,
+            discard=lambda response: response["Body"].close(),
+        )
+        body = cast(BinaryIO, response["Body"])
+
+        encoding = response.get("ContentEncoding")
+        if encoding in get_encodings():
+            return decompress(body, encoding)
+
+        return body
+
+    def get_object_parameters(self, name: str) -> Dict[str, Any]:
+        """
+        Get the parameters of a new object like `CacheControl`,
+        `ContentDisposition`, `Metadata` or `StorageClass`.
+        Defaults to `AWS_S3_OBJECT_PARAMETERS`, override it to set them per object.
+        """
+
+        return dict(self.AWS_S3_OBJECT_PARAMETERS)
+
+    def download(
+        self,
+        name: str,
+        dest: Union[str, "os.PathLike[str]", bytearray, memoryview, mmap.mmap],
+        part_size: int = 8 * 1024 * 1024,
+        max_workers: int = 8,
+    ) -> int:
+        """
+        Download the object to a local file path or into a writable buffer
+        like a `bytearray` or `mmap`, fetching ranges of `part_size` bytes
+        concurrently. Every range is written directly at its offset.
+        Returns the size of the object.
+        """
+
+        key = self.get_name(name)
+        with self._acquire():
+            response = self._s3.head_object(Bucket=self.AWS_S3_BUCKET_NAME, Key=key)
+
+        if response.get("ContentEncoding") in get_encodings():
+            # Ranges of compressed objects can not be decompressed on their own.
+            return self._download_stream(name, dest)
+
+        size = response["ContentLength"]
+        etag = response["ETag"]
+        ranges = [
+            (start, min(start + part_size, size)) for start in range(0, size, part_size)
         ]
 
-    def write(self, file: BinaryIO, name: str) -> str:
+        if isinstance(dest, (str, os.PathLike)):
+            flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+            fd = os.open(dest, flags, 0o666)
+            try:
+                os.ftruncate(fd, size)
+                _preallocate(fd, size)
+                self._download_ranges(
+                    key, etag, ranges, functools.partial(_pwrite, fd), max_workers
+                )
+            finally:
+                os.close(fd)
+            return size
+
+        with memoryview(dest) as view, view.cast("B") as buffer:
+            assert len(buffer) >= size, "Buffer is smaller than the object"
+
+            def write(offset: int, chunk: bytes) -> None:
+                buffer[offset : offset + len(chunk)] = chunk
+
+            self._download_ranges(key, etag, ranges, write, max_workers)
+
+        return size
+
+    def write(
+        self, file: BinaryIO, name: str, params: Optional[Dict[str, Any]] = None
+    ) -> str:
         """
         Write input file which is opened in binary mode to destination.
+        Returns the key of the object.
+
+        `params` are set on the object in addition to `get_object_parameters`.
         """
 
         file.seek(0, 0)
+        size = get_file_size(file)
+        file = limit_file(file, self.MAX_FILE_SIZE, self.ALLOWED_CONTENT_TYPES)
         key = self.get_name(name)
         content_type, _ = mimetypes.guess_type(key)
-        params = {
+        content_type = content_type or self.default_content_type
+        extra_args: Dict[str, Any] = {
             "ACL": self.AWS_DEFAULT_ACL,
-            "ContentType": content_type or self.default_content_type,
+            "ContentType": content_type,
         }
-        self._s3.upload_fileobj(file, self.AWS_S3_BUCKET_NAME, key, ExtraArgs=params)
+
+        if self.AWS_S3_VERSIONED_KEYS and size is not None:
+            key = self._get_versioned_key(key, file)
+            extra_args["CacheControl"] = self.AWS_S3_VERSIONED_CACHE_CONTROL
+
+        extra_args.update(self.get_object_parameters(key))
+        extra_args.update(params or {})
+
+        encoding = self._get_content_encoding(content_type)
+        if encoding and size is not None:
+            file = cast(BinaryIO, CompressedFile(file, encoding))
+            extra_args["ContentEncoding"] = encoding
+            extra_args["Metadata"] = {
+                **extra_args.get("Metadata", {}),
+                "uncompressed-size": str(size),
+            }
+
+        upload_args: Dict[str, Any] = {}
+        if self._get_limiter() is not None:
+            # The upload holds a single slot, so parts are sent one at a time.
+            upload_args["Config"] = TransferConfig(max_concurrency=1)
+
+        with self._acquire():
+            self._s3.upload_fileobj(
+                file, self.AWS_S3_BUCKET_NAME, key, ExtraArgs=extra_args, **upload_args
+            )
         return key
 
     def delete(self, name: str) -> None:
@@ -125,7 +496,9 @@ class S3Storage(BaseStorage):
         Delete the file from S3
         """
 
-        self._s3.delete_object(Bucket=self.AWS_S3_BUCKET_NAME, Key=self.get_name(name))
+        key = self.get_name(name)
+        with self._acquire():
+            self._s3.delete_object(Bucket=self.AWS_S3_BUCKET_NAME, Key=key)
 
     def generate_new_filename(self, filename: str) -> str:
         key = self.get_name(filename)
@@ -140,11 +513,221 @@ class S3Storage(BaseStorage):
 
         return filename
 
+    def iter_files(self, prefix: str = "") -> Iterator[FileInfo]:
+        """
+        Lazily iterate over the objects whose key starts with `prefix`,
+        fetching one page of keys at a time. Keys are yielded in sorted order.
+        """
+
+        paginator = self._s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.AWS_S3_BUCKET_NAME, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield FileInfo(obj["Key"], obj["Size"], obj["LastModified"].timestamp())
+
+    def _download_ranges(
+        self,
+        key: str,
+        etag: str,
+        ranges: List[Tuple[int, int]],
+        write: Callable[[int, bytes], None],
+        max_workers: int,
+    ) -> None:
+        def fetch(part: Tuple[int, int]) -> None:
+            start, end = part
+            with self._acquire():
+                body = self._s3.get_object(
+                    Bucket=self.AWS_S3_BUCKET_NAME,
+                    Key=key,
+                    Range=f"bytes={start}-{end - 1}",
+                    # Fails if the object is replaced during the download.
+                    IfMatch=etag,
+                )["Body"]
+                with closing(body):
+                    while start < end:
+                        chunk = body.read(min(self.default_chunk_size, end - start))
+                        if not chunk:
+                            raise OSError(f"Incomplete download of '{key}'")
+                        write(start, chunk)
+                        start += len(chunk)
+
+        for future in iter_concurrently(fetch, ranges, max_workers):
+            future.result()
+
+    def _download_stream(
+        self,
+        name: str,
+        dest: Union[str, "os.PathLike[str]", bytearray, memoryview, mmap.mmap],
+    ) -> int:
+        size = 0
+        with closing(self.open(name)) as source:
+            if isinstance(dest, (str, os.PathLike)):
+                with open(dest, "wb") as output:
+                    while True:
+                        chunk = source.read(self.default_chunk_size)
+                        if not chunk:
+                            break
+                        size += output.write(chunk)
+                return size
+
+            with memoryview(dest) as view, view.cast("B") as buffer:
+                while True:
+                    chunk = source.read(self.default_chunk_size)
+                    if not chunk:
+                        break
+                    buffer[size : size + len(chunk)] = chunk
+                    size += len(chunk)
+
+        return size
+
+    def _get_versioned_key(self, key: str, file: BinaryIO) -> str:
+        digest = hashlib.sha256()
+        while True:
+            chunk = file.read(self.default_chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+
+        file.seek(0, 0)
+        path = Path(key)
+        version = digest.hexdigest()[:16]
+        return str(path.with_name(f"{path.stem}.{version}{path.suffix}"))
+
+    def _get_content_encoding(self, content_type: str) -> Optional[str]:
+        for pattern, encoding in self.AWS_S3_COMPRESSION.items():
+            if fnmatchcase(content_type, pattern):
+                return encoding
+
+        return None
+
     def _check_object_exists(self, key: str) -> bool:
         try:
-            self._s3.head_object(Bucket=self.AWS_S3_BUCKET_NAME, Key=key)
+            self._hedge(self._s3.head_object, Bucket=self.AWS_S3_BUCKET_NAME, Key=key)
         except boto3.exceptions.botocore.exceptions.ClientError as e:
             if e.response["Error"]["Code"] == "404":
                 return False
 
         return True
+
+    def _hedge(
+        self,
+        fn: Callable[..., T],
+        discard: Optional[Callable[[T], Any]] = None,
+        **kwargs: Any,
+    ) -> T:
+        with self._acquire():
+            return self._send_hedged(fn, discard, **kwargs)
+
+    def _send_hedged(
+        self,
+        fn: Callable[..., T],
+        discard: Optional[Callable[[T], Any]] = None,
+        **kwargs: Any,
+    ) -> T:
+        if not self.AWS_S3_HEDGE_AFTER:
+            return fn(**kwargs)
+
+        with self._hedge_lock:
+            self.hedge_counters["requests"] += 1
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(
+                    max_workers=self.AWS_S3_HEDGE_MAX_WORKERS,
+                    thread_name_prefix="s3-hedge",
+                )
+            executor = self._hedge_executor
+
+        started = threading.Event()
+
+        def run() -> T:
+            started.set()
+            return fn(**kwargs)
+
+        first = executor.submit(run)
+        # Time spent waiting for a free worker is not latency of S3,
+        # but a hedge would only wait behind it when all workers are busy.
+        if not started.wait(self.AWS_S3_HEDGE_AFTER):
+            return first.result()
+
+        done, _ = wait([first], timeout=self.AWS_S3_HEDGE_AFTER)
+        if done:
+            return first.result()
+
+        with self._hedge_lock:
+            counters = self.hedge_counters
+            allowed = counters["hedged"] < (
+                counters["requests"] * self.AWS_S3_HEDGE_MAX_RATIO
+            )
+            if allowed:
+                counters["hedged"] += 1
+
+        if not allowed:
+            return first.result()
+
+        pending = {first, executor.submit(fn, **kwargs)}
+
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [future for future in done if future.exception() is None]
+            if not succeeded and pending:
+                continue
+
+            result = succeeded[0] if succeeded else done.pop()
+            if succeeded and result is not first:
+                with self._hedge_lock:
+                    self.hedge_counters["hedge_wins"] += 1
+
+            if discard is not None:
+                for future in succeeded[1:]:
+                    discard(future.result())
+                for future in pending:
+                    future.add_done_callback(_discarder(discard))
+
+            return result.result()
+
+
+_pwrite_lock = threading.Lock()
+
+
+def _pwrite(fd: int, offset: int, data: bytes) -> None:
+    if not hasattr(os, "pwrite"):  # pragma: no cover
+        with _pwrite_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while data:
+                data = data[os.write(fd, data) :]
+        return
+
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def _preallocate(fd: int, size: int) -> None:
+    if not size or not hasattr(os, "posix_fallocate"):  # pragma: no cover
+        return
+
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError:  # pragma: no cover
+        # Not supported by the underlying filesystem.
+        pass
+
+
+_instances: "weakref.WeakSet[S3Storage]" = weakref.WeakSet()
+
+
+def _reset_after_fork() -> None:
+    for storage in list(_instances):
+        storage._reset()
+
+
+if hasattr(os, "register_at_fork"):  # pragma: no cover
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _discarder(discard: Callable[[T], Any]) -> Callable[["Future[T]"], None]:
+    def callback(future: "Future[T]") -> None:
+        if future.exception() is None:
+            discard(future.result())
+
+    return callback
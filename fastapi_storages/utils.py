@@ -1,8 +1,53 @@
+import codecs
 import os
 import re
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+    cast,
+)
+
+from fastapi_storages.exceptions import ValidationException
+
+if TYPE_CHECKING:  # pragma: no cover
+    from fastapi_storages.base import StorageFile
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 _filename_ascii_strip_re = re.compile(r"[^A-Za-z0-9_.-]")
 
+_content_type_signatures = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"\x00\x00\x01\x00", "image/x-icon"),
+    (b"%PDF-", "application/pdf"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"\x28\xb5\x2f\xfd", "application/zstd"),
+    (b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (b"OggS", "audio/ogg"),
+    (b"ID3", "audio/mpeg"),
+    (b"fLaC", "audio/flac"),
+    (b"\x1a\x45\xdf\xa3", "video/webm"),
+)
+
 
 def secure_filename(filename: str) -> str:
     """
@@ -16,3 +61,182 @@ def secure_filename(filename: str) -> str:
     normalized_filename = _filename_ascii_strip_re.sub("", "_".join(filename.split()))
     filename = str(normalized_filename).strip("._")
     return filename
+
+
+def guess_content_type(header: bytes) -> str:
+    """
+    Guess the content type from the first bytes of a file using magic numbers.
+    """
+
+    for signature, content_type in _content_type_signatures:
+        if header.startswith(signature):
+            return content_type
+
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:8] == b"ftyp":
+        return "video/mp4"
+
+    if header and b"\x00" not in header:
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(header)
+        except UnicodeDecodeError:
+            pass
+        else:
+            return "text/plain"
+
+    return "application/octet-stream"
+
+
+def validate_content_type(
+    header: bytes, allowed_content_types: Optional[Sequence[str]]
+) -> None:
+    """
+    Raise `ValidationException` if the content type detected from the first
+    bytes of a file doesn't match any of the allowed content types.
+    """
+
+    if not allowed_content_types:
+        return
+
+    content_type = guess_content_type(header)
+    if not any(fnmatchcase(content_type, p) for p in allowed_content_types):
+        raise ValidationException(f"Content type '{content_type}' is not allowed")
+
+
+def validate_size(size: int, max_size: Optional[int]) -> None:
+    """
+    Raise `ValidationException` if the size exceeds the maximum size.
+    """
+
+    if max_size is not None and size > max_size:
+        raise ValidationException(f"File size exceeds the limit of {max_size} bytes")
+
+
+def validate_stored_file(
+    file: "StorageFile",
+    max_size: Optional[int] = None,
+    allowed_content_types: Optional[Sequence[str]] = None,
+) -> None:
+    """
+    Raise `ValidationException` if a file which is already stored,
+    like one from `ingest_multipart`, exceeds the limits.
+    """
+
+    if max_size is not None:
+        validate_size(file.size, max_size)
+
+    if allowed_content_types:
+        with file.open() as source:
+            validate_content_type(source.read(2048), allowed_content_types)
+
+
+class LimitedFile:
+    """
+    Wrapper around a file object opened in binary mode which validates
+    the size and content type of the data while it is being read.
+    Raises `ValidationException` as soon as a limit is crossed,
+    so storages can abort the write without copying the rest of the file.
+    """
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        max_size: Optional[int] = None,
+        allowed_content_types: Optional[Sequence[str]] = None,
+    ) -> None:
+        self._file = file
+        self._max_size = max_size
+        self._allowed_content_types = allowed_content_types
+        self._position = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._file.read(size)
+
+        if self._position == 0 and chunk:
+            validate_content_type(chunk, self._allowed_content_types)
+
+        self._position += len(chunk)
+        validate_size(self._position, self._max_size)
+        return chunk
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self._position = self._file.seek(offset, whence)
+        return self._position
+
+    def seekable(self) -> bool:
+        # Reported as non-seekable so consumers read it as a stream
+        # instead of measuring the size upfront.
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+
+def get_file_size(file: BinaryIO) -> Optional[int]:
+    """
+    Get the size of a seekable file in bytes without changing its position.
+    Returns `None` if the size can not be determined upfront.
+    """
+
+    if isinstance(file, LimitedFile):
+        file = file._file
+
+    seekable = getattr(file, "seekable", None)
+    if seekable is None or not seekable():
+        return None
+
+    position = file.tell()
+    size = file.seek(0, os.SEEK_END)
+    file.seek(position, os.SEEK_SET)
+    return size
+
+
+def limit_file(
+    file: BinaryIO,
+    max_size: Optional[int] = None,
+    allowed_content_types: Optional[Sequence[str]] = None,
+) -> BinaryIO:
+    """
+    Wrap the file in `LimitedFile` if any limits are set.
+    """
+
+    if max_size is None and not allowed_content_types:
+        return file
+
+    return cast(BinaryIO, LimitedFile(file, max_size, allowed_content_types))
+
+
+def iter_concurrently(
+    fn: Callable[[T], R], items: Iterable[T], max_workers: int
+) -> Iterator["Future[R]"]:
+    """
+    Call `fn` for each item in a thread pool and yield the futures in input order.
+    At most `2 * max_workers` items are pulled from `items` ahead of the consumer.
+    """
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: Deque["Future[R]"] = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= max_workers * 2:
+                yield pending.popleft()
+
+        while pending:
+            yield pending.popleft()
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """
+    Split an iterable into lists of at most `size` items.
+    """
+
+    chunk: List[T] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
@@ -0,0 +1,124 @@
+import asyncio
+import io
+import tarfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+
+from fastapi_storages import FileSystemStorage, MemoryStorage, StorageFile
+from fastapi_storages.archive import aiter_archive, iter_tar, iter_zip
+from fastapi_storages.base import BaseStorage
+
+
+def create_files(storage: BaseStorage, count: int = 10) -> List[StorageFile]:
+    files = []
+    for index in range(count):
+        file = StorageFile(name=f"{index}.txt", storage=storage)
+        file.write(io.BytesIO(str(index).encode() * (index * 1000)))
+        files.append(file)
+    return files
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_iter_zip(compression: int) -> None:
+    storage = MemoryStorage()
+    files = create_files(storage)
+
+    data = b"".join(iter_zip(files, compression=compression, prefetch=2))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == [file.name for file in files]
+        for file in files:
+            info = archive.getinfo(file.name)
+            assert info.compress_type == compression
+            assert archive.read(file.name) == file.open().read()
+
+
+def test_iter_tar(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    files = create_files(storage)
+
+    data = b"".join(iter_tar(files, prefetch=3, chunk_size=100))
+
+    assert len(data) % tarfile.RECORDSIZE == 0
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert archive.getnames() == [file.name for file in files]
+        for file in files:
+            member = archive.extractfile(file.name)
+            assert member is not None
+            assert member.read() == file.open().read()
+
+
+def test_iter_archive_skips_none() -> None:
+    storage = MemoryStorage()
+    files = create_files(storage, count=3)
+    entries = [None, files[0], None, None, files[1], files[2], None]
+
+    data = b"".join(iter_zip(entries, prefetch=2))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.namelist() == [file.name for file in files]
+
+    data = b"".join(iter_tar(entries, prefetch=2))
+
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert archive.getnames() == [file.name for file in files]
+
+
+def test_iter_archive_errors() -> None:
+    storage = MemoryStorage()
+    files = create_files(storage, count=3)
+    files.insert(1, StorageFile(name="missing.txt", storage=storage))
+
+    with pytest.raises(FileNotFoundError):
+        b"".join(iter_tar(files))
+
+    # Closing the stream early stops the prefetching threads.
+    chunks = iter_zip(create_files(storage, count=20), prefetch=4, chunk_size=10)
+    next(chunks)
+    chunks.close()
+
+
+def test_aiter_archive() -> None:
+    storage = MemoryStorage()
+    files = create_files(storage, count=3)
+
+    async def read() -> bytes:
+        return b"".join([chunk async for chunk in aiter_archive(iter_zip(files))])
+
+    data = asyncio.run(read())
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.read("2.txt") == b"2" * 2000
+
+
+def test_aiter_archive_cancelled() -> None:
+    closed = threading.Event()
+
+    def chunks() -> Iterator[bytes]:
+        try:
+            while True:
+                time.sleep(0.2)
+                yield b"123"
+        finally:
+            closed.set()
+
+    async def read() -> None:
+        async for _ in aiter_archive(chunks()):
+            pass
+
+    async def main() -> None:
+        task = asyncio.create_task(read())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+
+    assert closed.wait(timeout=1)
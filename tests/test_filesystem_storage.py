@@ -1,6 +1,13 @@
+import io
+import time
 from pathlib import Path
+from typing import BinaryIO
+
+import pytest
 
 from fastapi_storages import FileSystemStorage, StorageFile, StorageImage
+from fastapi_storages.base import prefetch_metadata
+from fastapi_storages.exceptions import ValidationException
 
 
 def test_filesystem_storage_file_properties(tmp_path: Path) -> None:
@@ -79,3 +86,218 @@ def test_filesystem_storage_delete_file(tmp_path: Path) -> None:
     file.delete()
 
     assert (tmp_path / "example.txt").exists() is False
+
+
+def test_filesystem_storage_max_file_size(tmp_path: Path) -> None:
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"1" * 200 * 1024)
+
+    class LimitedFileSystemStorage(FileSystemStorage):
+        MAX_FILE_SIZE = 100 * 1024
+
+    storage = LimitedFileSystemStorage(path=tmp_path)
+    file = StorageFile(name="example.txt", storage=storage)
+
+    with pytest.raises(ValidationException):
+        file.write(file=input_file.open("rb"))
+
+    assert [path.name for path in tmp_path.iterdir()] == ["input.txt"]
+
+
+def test_filesystem_storage_max_file_size_before_allocation(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    input_file = tmp_path / "input.txt"
+    with input_file.open("wb") as f:
+        f.truncate(5 * 1024 * 1024 * 1024)
+
+    class LimitedFileSystemStorage(FileSystemStorage):
+        MAX_FILE_SIZE = 1024
+
+    storage = LimitedFileSystemStorage(path=tmp_path / "files")
+    allocated = []
+    monkeypatch.setattr(
+        storage, "_preallocate", lambda fd, size: allocated.append(size)
+    )
+
+    with pytest.raises(ValidationException):
+        storage.write(input_file.open("rb"), "example.txt")
+
+    assert allocated == []
+    assert list((tmp_path / "files").iterdir()) == []
+
+
+def test_filesystem_storage_allowed_content_types(tmp_path: Path) -> None:
+    input_file = tmp_path / "input.png"
+    input_file.write_bytes(b"123")
+
+    class ImageFileSystemStorage(FileSystemStorage):
+        ALLOWED_CONTENT_TYPES = ["image/*"]
+
+    storage = ImageFileSystemStorage(path=tmp_path)
+    file = StorageFile(name="example.png", storage=storage)
+
+    with pytest.raises(ValidationException):
+        file.write(file=input_file.open("rb"))
+
+    input_file.write_bytes(b"\x89PNG\r\n\x1a\n123")
+    file.write(file=input_file.open("rb"))
+
+    assert file.size == 11
+
+
+@pytest.mark.parametrize("durability", ["none", "file", "directory"])
+def test_filesystem_storage_atomic_write(tmp_path: Path, durability: str) -> None:
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123" * 1024)
+
+    storage = FileSystemStorage(path=tmp_path / "files", durability=durability)
+    file = StorageFile(name="example.txt", storage=storage)
+    file.write(file=input_file.open("rb"))
+    file.write(file=input_file.open("rb"))
+
+    assert [path.name for path in (tmp_path / "files").iterdir()] == ["example.txt"]
+    assert file.open().read() == b"123" * 1024
+
+
+def test_filesystem_storage_invalid_durability(tmp_path: Path) -> None:
+    with pytest.raises(AssertionError):
+        FileSystemStorage(path=tmp_path, durability="always")
+
+
+def test_filesystem_storage_sharding(tmp_path: Path) -> None:
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123")
+
+    class NonOverwritingFileSystemStorage(FileSystemStorage):
+        OVERWRITE_EXISTING_FILES = False
+
+    storage = NonOverwritingFileSystemStorage(path=tmp_path / "files", shard_depth=2)
+    file1 = StorageFile(name="example.txt", storage=storage)
+    file1.write(file=input_file.open("rb"))
+    file2 = StorageFile(name="example.txt", storage=storage)
+    file2.write(file=input_file.open("rb"))
+
+    path = Path(file1.path)
+    assert file1.name == "example.txt"
+    assert file2.name == "example_1.txt"
+    assert len(path.relative_to(tmp_path / "files").parts) == 3
+    assert path.exists() is True
+    assert file1.size == 3
+
+    file1.delete()
+
+    assert path.exists() is False
+
+
+def test_filesystem_storage_reshard(tmp_path: Path) -> None:
+    for i in range(20):
+        (tmp_path / f"file_{i}.txt").write_bytes(b"123")
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "file.txt").write_bytes(b"123")
+
+    storage = FileSystemStorage(path=tmp_path, shard_depth=2)
+
+    assert storage.reshard(max_workers=4) == 20
+    assert storage.reshard() == 0
+    assert all(Path(storage.get_path(f"file_{i}.txt")).exists() for i in range(20))
+    assert (tmp_path / "other" / "file.txt").exists() is True
+
+    storage = FileSystemStorage(path=tmp_path)
+
+    assert storage.reshard() == 20
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [f"file_{i}.txt" for i in range(20)] + ["other"]
+    )
+
+
+def test_filesystem_storage_iter_files(tmp_path: Path) -> None:
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123")
+
+    storage = FileSystemStorage(path=tmp_path / "files", shard_depth=1)
+    for name in ("a.txt", "b1.txt", "b2.txt"):
+        storage.write(file=input_file.open("rb"), name=name)
+
+    files = sorted(storage.iter_files())
+
+    assert [file.name for file in files] == ["a.txt", "b1.txt", "b2.txt"]
+    assert all(file.size == 3 and file.mtime > 0 for file in files)
+    assert sorted(file.name for file in storage.iter_files("b")) == [
+        "b1.txt",
+        "b2.txt",
+    ]
+
+
+def test_filesystem_storage_write_many(tmp_path: Path) -> None:
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123")
+    large_file = tmp_path / "large.txt"
+    large_file.write_bytes(b"1" * 1024)
+
+    class LimitedFileSystemStorage(FileSystemStorage):
+        MAX_FILE_SIZE = 100
+
+    storage = LimitedFileSystemStorage(path=tmp_path / "files")
+    files = ((large_file if i == 3 else input_file).open("rb") for i in range(10))
+    results = storage.write_many(
+        ((file, f"{i}.txt") for i, file in enumerate(files)), max_workers=2
+    )
+
+    assert len(results) == 10
+    assert isinstance(results[3], ValidationException)
+    assert [result.name for result in results if isinstance(result, StorageFile)] == [
+        f"{i}.txt" for i in range(10) if i != 3
+    ]
+
+
+def test_filesystem_storage_write_many_duplicate_names(tmp_path: Path) -> None:
+    class SlowFileSystemStorage(FileSystemStorage):
+        OVERWRITE_EXISTING_FILES = False
+
+        def write(self, file: BinaryIO, name: str) -> str:
+            time.sleep(0.05)
+            return super().write(file, name)
+
+    storage = SlowFileSystemStorage(path=tmp_path)
+    (tmp_path / "a.txt").write_bytes(b"existing")
+
+    results = storage.write_many(
+        ((io.BytesIO(str(i).encode()), "a.txt") for i in range(8)), max_workers=8
+    )
+
+    names = [result.name for result in results if isinstance(result, StorageFile)]
+    assert sorted(names) == sorted(f"a_{i}.txt" for i in range(1, 9))
+    assert (tmp_path / "a.txt").read_bytes() == b"existing"
+    assert sorted(storage.open(name).read() for name in names) == sorted(
+        str(i).encode() for i in range(8)
+    )
+
+
+def test_filesystem_storage_view(tmp_path: Path) -> None:
+    (tmp_path / "example.txt").write_bytes(b"123")
+    (tmp_path / "empty.txt").touch()
+
+    storage = FileSystemStorage(path=tmp_path)
+    view = StorageFile(name="example.txt", storage=storage).view()
+
+    assert view.readonly is True
+    assert view.tobytes() == b"123"
+    assert StorageFile(name="empty.txt", storage=storage).view().tobytes() == b""
+
+
+def test_filesystem_storage_prefetch_metadata(tmp_path: Path) -> None:
+    for i in range(3):
+        (tmp_path / f"{i}.txt").write_bytes(b"123")
+
+    storage = FileSystemStorage(path=tmp_path)
+    files = [StorageFile(name=f"{i}.txt", storage=storage) for i in range(4)]
+    prefetch_metadata(files + [None])
+
+    for i in range(3):
+        (tmp_path / f"{i}.txt").unlink()
+
+    assert [file.size for file in files[:3]] == [3, 3, 3]
+
+    with pytest.raises(FileNotFoundError):
+        files[3].size
@@ -0,0 +1,109 @@
+import io
+import random
+from pathlib import Path
+
+from PIL import Image
+
+from fastapi_storages import FileSystemStorage, MemoryStorage, StorageFile
+from fastapi_storages.images import (
+    ImageMetadata,
+    decode_image_value,
+    describe_sample,
+    encode_blurhash,
+    encode_image_value,
+    extract_metadata,
+    extract_metadata_many,
+    sample_image,
+    submit_extract_metadata,
+)
+
+
+def create_image(width: int = 400, height: int = 200, orientation: int = 1) -> bytes:
+    image = Image.new("RGB", (width, height), (200, 20, 20))
+    image.paste((20, 20, 200), (0, 0, width // 4, height))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+
+    output = io.BytesIO()
+    image.save(output, "JPEG", exif=exif)
+    return output.getvalue()
+
+
+def test_encode_blurhash() -> None:
+    rng = random.Random(1)
+    width, height = 13, 9
+    pixels = [
+        (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        for _ in range(width * height)
+    ]
+
+    assert encode_blurhash(pixels, width, height) == "LNHek1yVO;w7~ol1OZJoo$y2OqEN"
+    assert encode_blurhash([(255, 255, 255)], 1, 1, 1, 1) == "00TSUA"
+
+
+def test_extract_metadata() -> None:
+    metadata = extract_metadata(create_image(orientation=6))
+
+    assert metadata.width == 400
+    assert metadata.height == 200
+    assert metadata.orientation == 6
+    assert len(metadata.blurhash) == 28
+    assert metadata.dominant_color.startswith("#c")
+
+    assert extract_metadata(create_image()).blurhash != metadata.blurhash
+
+
+def test_sample_image() -> None:
+    sample = sample_image(io.BytesIO(create_image(2000, 1000, orientation=6)))
+
+    assert (sample.width, sample.height, sample.orientation) == (2000, 1000, 6)
+    assert sample.size == (16, 32)
+    assert len(sample.pixels) == 16 * 32 * 3
+    assert describe_sample(sample).width == 2000
+
+
+def test_image_value() -> None:
+    metadata = ImageMetadata(800, 600, 6, "LNHek1yVO;w7~ol1OZJoo$y2OqEN", "#c81414")
+    value = encode_image_value("a/image.png", metadata)
+
+    assert value.startswith("a/image.png#w=800&h=600&o=6&bh=")
+    assert decode_image_value(value) == ("a/image.png", metadata)
+    assert decode_image_value("image.png") == ("image.png", None)
+    assert decode_image_value("a#b/image.png") == ("a#b/image.png", None)
+    assert encode_image_value("image.png", None) == "image.png"
+
+
+def test_extract_metadata_many() -> None:
+    storage = MemoryStorage()
+    StorageFile(name="image.jpg", storage=storage).write(io.BytesIO(create_image()))
+    StorageFile(name="invalid.jpg", storage=storage).write(io.BytesIO(b"123"))
+
+    metadata = extract_metadata_many(storage, ["image.jpg", "invalid.jpg", "a.jpg"])
+
+    assert list(metadata) == ["image.jpg"]
+    assert metadata["image.jpg"].width == 400
+
+
+def test_extract_metadata_many_filesystem(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    StorageFile(name="image.jpg", storage=storage).write(io.BytesIO(create_image()))
+    StorageFile(name="invalid.jpg", storage=storage).write(io.BytesIO(b"123"))
+
+    metadata = extract_metadata_many(storage, ["image.jpg", "invalid.jpg", "a.jpg"])
+
+    assert list(metadata) == ["image.jpg"]
+    assert metadata["image.jpg"].width == 400
+
+
+def test_submit_extract_metadata(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    StorageFile(name="image.png", storage=storage).write(io.BytesIO(create_image()))
+
+    # The worker reads local images from their path.
+    future = submit_extract_metadata(io.BytesIO(), storage, "image.png")
+    assert future.result().width == 400
+
+    future = submit_extract_metadata(
+        io.BytesIO(create_image(orientation=6)), MemoryStorage(), "image.png"
+    )
+    assert future.result().orientation == 6
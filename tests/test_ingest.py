@@ -0,0 +1,126 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List
+
+import pytest
+
+from fastapi_storages import FileSystemStorage, StorageFile
+from fastapi_storages.exceptions import ValidationException
+from fastapi_storages.ingest import ingest_multipart
+
+
+class Request:
+    """
+    Dummy Request like the one in Starlette.
+    """
+
+    def __init__(self, body: bytes, headers: Dict[str, str]) -> None:
+        self.body = body
+        self.headers = headers
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        for i in range(0, len(self.body), 1000):
+            yield self.body[i : i + 1000]
+
+
+def multipart_request(parts: List[bytes]) -> Request:
+    body = b"".join(b"--boundary\r\n" + part + b"\r\n" for part in parts)
+    body += b"--boundary--\r\n"
+    headers = {"content-type": "multipart/form-data; boundary=boundary"}
+    return Request(body, headers)
+
+
+def test_ingest_multipart(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    request = multipart_request(
+        [
+            b'Content-Disposition: form-data; name="title"\r\n\r\nExample',
+            b'Content-Disposition: form-data; name="file"; filename="example.txt"\r\n'
+            b"Content-Type: text/plain\r\n\r\n" + b"123" * 100000,
+            b'Content-Disposition: form-data; name="empty"; filename=""\r\n\r\n',
+        ]
+    )
+
+    form = asyncio.run(ingest_multipart(request, storage))
+
+    assert [name for name, _ in form] == ["title", "file", "empty"]
+    assert form[0][1] == "Example"
+    assert isinstance(form[1][1], StorageFile)
+    assert form[1][1].name == "example.txt"
+    assert form[1][1].open().read() == b"123" * 100000
+    assert form[2][1] is None
+
+
+def test_ingest_multipart_aborts_invalid_file(tmp_path: Path) -> None:
+    class LimitedFileSystemStorage(FileSystemStorage):
+        MAX_FILE_SIZE = 1000
+
+    storage = LimitedFileSystemStorage(path=str(tmp_path))
+    request = multipart_request(
+        [
+            b'Content-Disposition: form-data; name="file"; filename="example.txt"\r\n'
+            b"\r\n" + b"123" * 100000,
+        ]
+    )
+
+    with pytest.raises(ValidationException):
+        asyncio.run(ingest_multipart(request, storage))
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_ingest_multipart_invalid_request(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    request = Request(b"{}", {"content-type": "application/json"})
+
+    with pytest.raises(ValidationException):
+        asyncio.run(ingest_multipart(request, storage))
+
+
+def test_ingest_multipart_disconnect(tmp_path: Path) -> None:
+    class DisconnectedRequest(Request):
+        async def stream(self) -> AsyncIterator[bytes]:
+            yield self.body[:5000]
+            raise ConnectionError()
+
+    storage = FileSystemStorage(path=str(tmp_path))
+    request = multipart_request(
+        [
+            b'Content-Disposition: form-data; name="file"; filename="example.txt"\r\n'
+            b"\r\n" + b"123" * 100000,
+        ]
+    )
+    request = DisconnectedRequest(request.body, request.headers)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(ingest_multipart(request, storage))
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_ingest_multipart_concurrent_uploads(tmp_path: Path) -> None:
+    class SlowRequest(Request):
+        async def stream(self) -> AsyncIterator[bytes]:
+            async for chunk in super().stream():
+                await asyncio.sleep(0)
+                yield chunk
+
+    storage = FileSystemStorage(path=str(tmp_path))
+
+    def request(i: int) -> Request:
+        headers = f'Content-Disposition: form-data; name="file"; filename="{i}.txt"'
+        request = multipart_request([headers.encode() + b"\r\n\r\n" + b"123" * 100000])
+        return SlowRequest(request.body, request.headers)
+
+    async def main() -> List[List[Any]]:
+        # Uploads outnumber the threads available to the storage writers.
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=2))
+        uploads = [ingest_multipart(request(i), storage) for i in range(8)]
+        return await asyncio.wait_for(asyncio.gather(*uploads), timeout=30)
+
+    forms = asyncio.run(main())
+
+    assert [form[0][1].name for form in forms] == [f"{i}.txt" for i in range(8)]
+    assert all((tmp_path / f"{i}.txt").stat().st_size == 300000 for i in range(8))
@@ -4,8 +4,13 @@ from pathlib import Path
 import pytest
 from peewee import AutoField, Model, SqliteDatabase
 
-from fastapi_storages import FileSystemStorage
-from fastapi_storages.integrations.peewee import FileType
+from fastapi_storages import FileSystemStorage, StorageFile
+from fastapi_storages.exceptions import ValidationException
+from fastapi_storages.integrations.peewee import (
+    FileType,
+    find_orphans,
+    prefetch_metadata,
+)
 from tests.engine import database_name
 from tests.test_integrations.utils import UploadFile
 
@@ -15,6 +20,12 @@ db = SqliteDatabase(database_name)
 class Model(Model):
     id = AutoField(primary_key=True)
     file = FileType(storage=FileSystemStorage(path="/tmp"), null=True)
+    document = FileType(
+        storage=FileSystemStorage(path="/tmp"),
+        max_size=1024,
+        allowed_content_types=["application/pdf"],
+        null=True,
+    )
 
     class Meta:
         database = db
@@ -55,3 +66,104 @@ def test_clear_empty_file() -> None:
 
     model = Model.get()
     assert model.file is None
+
+
+@pytest.mark.parametrize("content", [b"%PDF-" + b"1" * 1024, b"123"])
+def test_invalid_document(tmp_path: Path, content: bytes) -> None:
+    Model.document.storage = FileSystemStorage(path=str(tmp_path))
+
+    input_file = tmp_path / "input.pdf"
+    input_file.write_bytes(content)
+
+    upload_file = UploadFile(file=input_file.open("rb"), filename="document.pdf")
+
+    with pytest.raises(ValidationException):
+        Model.create(document=upload_file)
+
+    assert (tmp_path / "document.pdf").exists() is False
+
+
+def test_stored_file(tmp_path: Path) -> None:
+    Model.file.storage = FileSystemStorage(path=str(tmp_path))
+
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123")
+
+    upload_file = UploadFile(file=input_file.open("rb"), filename="example.txt")
+    Model.create(file=upload_file)
+
+    model = Model.get()
+    model.save()
+    Model.create(file=model.file)
+
+    assert Model.select().where(Model.file == "example.txt").count() == 2
+
+
+def test_stored_file_limits(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    Model.document.storage = storage
+
+    storage.write(io.BytesIO(b"%PDF-" + b"1" * 2048), "large.pdf")
+    storage.write(io.BytesIO(b"123"), "text.pdf")
+    storage.write(io.BytesIO(b"%PDF-123"), "document.pdf")
+
+    for name in ["large.pdf", "text.pdf"]:
+        with pytest.raises(ValidationException):
+            Model.create(document=StorageFile(name=name, storage=storage))
+
+    Model.create(document=StorageFile(name="document.pdf", storage=storage))
+
+
+def test_find_orphans(tmp_path: Path) -> None:
+    Model.file.storage = FileSystemStorage(path=str(tmp_path))
+
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123")
+
+    for i in range(5):
+        upload_file = UploadFile(file=input_file.open("rb"), filename=f"{i}.txt")
+        Model.create(file=upload_file)
+
+    orphans = find_orphans(Model.file, batch_size=2, older_than=0)
+
+    assert sorted(file.name for file in orphans) == ["input.txt"]
+
+    # Recently written files may belong to rows which are not committed yet.
+    assert list(find_orphans(Model.file)) == []
+
+
+def test_write_many(tmp_path: Path) -> None:
+    Model.file.storage = FileSystemStorage(path=str(tmp_path))
+
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123")
+
+    upload_files = [
+        UploadFile(file=input_file.open("rb"), filename=f"{i}.txt") for i in range(5)
+    ]
+    files = Model.file.write_many(upload_files)
+    Model.insert_many([{"file": file} for file in files]).execute()
+
+    models = Model.select().order_by(Model.id)
+
+    assert [model.file.name for model in models] == [f"{i}.txt" for i in range(5)]
+    assert all(model.file.size == 3 for model in models)
+
+
+def test_prefetch_metadata(tmp_path: Path) -> None:
+    Model.file.storage = FileSystemStorage(path=str(tmp_path))
+
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123")
+
+    for i in range(5):
+        upload_file = UploadFile(file=input_file.open("rb"), filename=f"{i}.txt")
+        Model.create(file=upload_file)
+
+    models = list(Model.select())
+    prefetch_metadata(models, Model.file)
+
+    for i in range(5):
+        (tmp_path / f"{i}.txt").unlink()
+
+    assert [model.file.size for model in models] == [3] * 5
@@ -5,9 +5,13 @@ import pytest
 from peewee import AutoField, Model, SqliteDatabase
 from PIL import Image
 
-from fastapi_storages import FileSystemStorage
+from fastapi_storages import FileSystemStorage, StorageFile
 from fastapi_storages.exceptions import ValidationException
-from fastapi_storages.integrations.peewee import ImageType
+from fastapi_storages.integrations.peewee import (
+    ImageType,
+    backfill_image_metadata,
+    find_orphans,
+)
 from tests.engine import database_name
 from tests.test_integrations.utils import UploadFile
 
@@ -22,11 +26,19 @@ class Model(Model):
         database = db
 
 
+class MetadataModel(Model):
+    id = AutoField(primary_key=True)
+    image = ImageType(storage=FileSystemStorage(path="/tmp"), metadata=True)
+
+    class Meta:
+        database = db
+
+
 @pytest.fixture(autouse=True)
 def prepare_database():
-    db.create_tables([Model])
+    db.create_tables([Model, MetadataModel])
     yield
-    db.drop_tables([Model])
+    db.drop_tables([Model, MetadataModel])
 
 
 def test_valid_image(tmp_path: Path) -> None:
@@ -54,6 +66,22 @@ def test_invalid_image(tmp_path: Path) -> None:
         Model.create(image=upload_file)
 
 
+def test_stored_image(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    Model.image.storage = storage
+
+    storage.write(io.BytesIO(b"123"), "invalid.png")
+    Image.new("RGB", (80, 40)).save(tmp_path / "image.png", "PNG")
+
+    with pytest.raises(ValidationException):
+        Model.create(image=StorageFile(name="invalid.png", storage=storage))
+
+    Model.create(image=StorageFile(name="image.png", storage=storage))
+    model = Model.get()
+
+    assert (model.image.width, model.image.height) == (80, 40)
+
+
 def test_nullable_image() -> None:
     Model.create(image=None)
     model = Model.get()
@@ -67,3 +95,73 @@ def test_clear_empty_image() -> None:
     model = Model.get()
 
     assert model.image is None
+
+
+def test_image_metadata(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path / "images"))
+    MetadataModel.image.storage = storage
+
+    input_file = tmp_path / "input.jpg"
+    image = Image.new("RGB", (800, 400), (200, 20, 20))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    image.save(input_file, "JPEG", exif=exif)
+
+    upload_file = UploadFile(file=input_file.open("rb"), filename="image.jpg")
+    MetadataModel.create(image=upload_file)
+    storage.write(input_file.open("rb"), "orphan.jpg")
+
+    value = db.execute(MetadataModel.select(MetadataModel.image)).fetchone()[0]
+
+    assert value.startswith("image.jpg#w=800&h=400&o=6&bh=")
+    orphans = find_orphans(MetadataModel.image, older_than=0)
+    assert [file.name for file in orphans] == ["orphan.jpg"]
+
+    # Metadata is read from the column without opening the image.
+    Path(storage.get_path("image.jpg")).unlink()
+    model = MetadataModel.get()
+
+    assert model.image.name == "image.jpg"
+    assert (model.image.width, model.image.height) == (800, 400)
+    assert model.image.orientation == 6
+    assert model.image.blurhash is not None
+
+
+def test_find_orphans_with_metadata(tmp_path: Path) -> None:
+    MetadataModel.image.storage = FileSystemStorage(path=str(tmp_path))
+
+    for i in range(1200):
+        (tmp_path / f"{i:0{i % 4 + 1}}.jpg").touch()
+
+    fragment = "#w=1&h=1&o=1&bh=00TSUA&c=%23ffffff"
+    rows = [
+        {"image": f"{i:0{i % 4 + 1}}.jpg" + (fragment if i % 2 else "")}
+        for i in range(1200)
+        if i % 3
+    ]
+    MetadataModel.insert_many(rows).execute()
+
+    orphans = find_orphans(MetadataModel.image, older_than=0)
+
+    assert sorted(file.name for file in orphans) == sorted(
+        f"{i:0{i % 4 + 1}}.jpg" for i in range(0, 1200, 3)
+    )
+
+
+def test_backfill_image_metadata(tmp_path: Path) -> None:
+    Model.image.storage = FileSystemStorage(path=str(tmp_path))
+
+    for name in ["a.png", "b.png", "c.png"]:
+        Image.new("RGB", (80, 40), (20, 20, 200)).save(tmp_path / name, "PNG")
+    (tmp_path / "invalid.png").write_bytes(b"123")
+
+    for name in ["a.png", "b.png", "b.png", "c.png", "invalid.png", "missing.png"]:
+        Model.create(image=name)
+
+    assert backfill_image_metadata(Model.image, batch_size=2) == 4
+    assert backfill_image_metadata(Model.image) == 0
+
+    model = Model.get_by_id(1)
+
+    assert model.image.name == "a.png"
+    assert model.image.dominant_color == "#1414c8"
@@ -3,10 +3,15 @@ from pathlib import Path
 
 import pytest
 from sqlalchemy import Column, Integer, create_engine
+from sqlalchemy.exc import StatementError
 from sqlalchemy.orm import Session, declarative_base
 
-from fastapi_storages import FileSystemStorage
-from fastapi_storages.integrations.sqlalchemy import FileType
+from fastapi_storages import FileSystemStorage, StorageFile
+from fastapi_storages.integrations.sqlalchemy import (
+    FileType,
+    find_orphans,
+    prefetch_metadata,
+)
 from tests.engine import database_uri
 from tests.test_integrations.utils import UploadFile
 
@@ -19,6 +24,13 @@ class Model(Base):
 
     id = Column(Integer, primary_key=True)
     file = Column(FileType(storage=FileSystemStorage(path="/tmp")))
+    document = Column(
+        FileType(
+            storage=FileSystemStorage(path="/tmp"),
+            max_size=1024,
+            allowed_content_types=["application/pdf"],
+        )
+    )
 
 
 @pytest.fixture(autouse=True)
@@ -26,6 +38,9 @@ def prepare_database():
     Base.metadata.create_all(engine)
     yield
     Base.metadata.drop_all(engine)
+    # Types are copied per dialect and cached, reset them so tests can swap storages.
+    engine.dialect._type_memos.clear()
+    Model.__mapper__._compiled_cache.clear()
 
 
 def test_valid_file(tmp_path: Path) -> None:
@@ -65,3 +80,129 @@ def test_clear_empty_file() -> None:
         session.commit()
 
         assert model.file is None
+
+
+@pytest.mark.parametrize("content", [b"%PDF-" + b"1" * 1024, b"123"])
+def test_invalid_document(tmp_path: Path, content: bytes) -> None:
+    Model.document.type.storage = FileSystemStorage(path=str(tmp_path))
+
+    input_file = tmp_path / "input.pdf"
+    input_file.write_bytes(content)
+
+    upload_file = UploadFile(file=input_file.open("rb"), filename="document.pdf")
+    model = Model(document=upload_file)
+
+    with Session(engine) as session:
+        session.add(model)
+
+        with pytest.raises(StatementError):
+            session.commit()
+
+    assert (tmp_path / "document.pdf").exists() is False
+
+
+def test_stored_file(tmp_path: Path) -> None:
+    Model.file.type.storage = FileSystemStorage(path=str(tmp_path))
+
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123")
+
+    upload_file = UploadFile(file=input_file.open("rb"), filename="example.txt")
+    model = Model(file=upload_file)
+
+    with Session(engine) as session:
+        session.add(model)
+        session.commit()
+
+        copy = Model(file=model.file)
+        session.add(copy)
+        session.commit()
+
+        assert copy.file.name == "example.txt"
+        assert session.query(Model).filter(Model.file == "example.txt").count() == 2
+
+
+def test_stored_file_limits(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    Model.document.type.storage = storage
+
+    storage.write(io.BytesIO(b"%PDF-" + b"1" * 2048), "large.pdf")
+    storage.write(io.BytesIO(b"123"), "text.pdf")
+    storage.write(io.BytesIO(b"%PDF-123"), "document.pdf")
+
+    with Session(engine) as session:
+        for name in ["large.pdf", "text.pdf"]:
+            session.add(Model(document=StorageFile(name=name, storage=storage)))
+
+            with pytest.raises(StatementError):
+                session.commit()
+            session.rollback()
+
+        document = StorageFile(name="document.pdf", storage=storage)
+        session.add(Model(document=document))
+        session.commit()
+
+
+def test_find_orphans(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    Model.file.type.storage = storage
+
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123")
+
+    with Session(engine) as session:
+        for i in range(5):
+            upload_file = UploadFile(file=input_file.open("rb"), filename=f"{i}.txt")
+            session.add(Model(file=upload_file))
+        session.commit()
+
+        orphans = find_orphans(session, Model.file, batch_size=2, older_than=0)
+
+        assert sorted(file.name for file in orphans) == ["input.txt"]
+
+        # Recently written files may belong to rows which are not committed yet.
+        assert list(find_orphans(session, Model.file)) == []
+
+
+def test_write_many(tmp_path: Path) -> None:
+    Model.file.type.storage = FileSystemStorage(path=str(tmp_path))
+
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123")
+
+    upload_files = [
+        UploadFile(file=input_file.open("rb"), filename=f"{i}.txt") for i in range(5)
+    ]
+    files = Model.file.type.write_many(upload_files)
+
+    with Session(engine) as session:
+        session.bulk_save_objects([Model(file=file) for file in files])
+        session.commit()
+
+        models = session.query(Model).order_by(Model.id).all()
+
+        assert [model.file.name for model in models] == [f"{i}.txt" for i in range(5)]
+        assert all(model.file.size == 3 for model in models)
+
+
+def test_prefetch_metadata(tmp_path: Path) -> None:
+    Model.file.type.storage = FileSystemStorage(path=str(tmp_path))
+
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(b"123")
+
+    with Session(engine) as session:
+        for i in range(5):
+            upload_file = UploadFile(file=input_file.open("rb"), filename=f"{i}.txt")
+            session.add(Model(file=upload_file))
+        session.add(Model(file=None))
+        session.commit()
+
+    with Session(engine) as session:
+        models = session.query(Model).all()
+        prefetch_metadata(models, Model.file)
+
+        for i in range(5):
+            (tmp_path / f"{i}.txt").unlink()
+
+        assert [model.file.size for model in models[:5]] == [3] * 5
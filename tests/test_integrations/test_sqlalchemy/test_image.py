@@ -3,12 +3,24 @@ from pathlib import Path
 
 import pytest
 from PIL import Image
-from sqlalchemy import Column, Integer, create_engine
+from sqlalchemy import (
+    Column,
+    Integer,
+    Unicode,
+    create_engine,
+    insert,
+    select,
+    type_coerce,
+)
 from sqlalchemy.exc import StatementError
 from sqlalchemy.orm import Session, declarative_base
 
-from fastapi_storages import FileSystemStorage
-from fastapi_storages.integrations.sqlalchemy import ImageType
+from fastapi_storages import FileSystemStorage, StorageFile
+from fastapi_storages.integrations.sqlalchemy import (
+    ImageType,
+    backfill_image_metadata,
+    find_orphans,
+)
 from tests.engine import database_uri
 from tests.test_integrations.utils import UploadFile
 
@@ -28,6 +40,10 @@ def prepare_database():
     Base.metadata.create_all(engine)
     yield
     Base.metadata.drop_all(engine)
+    # Types are copied per dialect and cached, reset them so tests can swap storages.
+    engine.dialect._type_memos.clear()
+    Model.__mapper__._compiled_cache.clear()
+    engine._compiled_cache.clear()
 
 
 def test_valid_image(tmp_path: Path) -> None:
@@ -63,6 +79,27 @@ def test_invalid_image(tmp_path: Path) -> None:
             session.commit()
 
 
+def test_stored_image(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    Model.image.type.storage = storage
+
+    storage.write(io.BytesIO(b"123"), "invalid.png")
+    Image.new("RGB", (80, 40)).save(tmp_path / "image.png", "PNG")
+
+    with Session(engine) as session:
+        session.add(Model(image=StorageFile(name="invalid.png", storage=storage)))
+
+        with pytest.raises(StatementError):
+            session.commit()
+        session.rollback()
+
+        model = Model(image=StorageFile(name="image.png", storage=storage))
+        session.add(model)
+        session.commit()
+
+        assert (model.image.width, model.image.height) == (80, 40)
+
+
 def test_nullable_image() -> None:
     model = Model(image=None)
 
@@ -82,3 +119,117 @@ def test_clear_empty_image() -> None:
         session.commit()
 
         assert model.image is None
+
+
+class MetadataModel(Base):
+    __tablename__ = "metadata_model"
+
+    id = Column(Integer, primary_key=True)
+    image = Column(ImageType(storage=FileSystemStorage(path="/tmp"), metadata=True))
+
+
+def test_image_metadata(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path / "images"))
+    MetadataModel.image.type.storage = storage
+
+    input_file = tmp_path / "input.jpg"
+    image = Image.new("RGB", (800, 400), (200, 20, 20))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    image.save(input_file, "JPEG", exif=exif)
+
+    upload_file = UploadFile(file=input_file.open("rb"), filename="image.jpg")
+    model = MetadataModel(image=upload_file)
+
+    with Session(engine) as session:
+        session.add(model)
+        session.commit()
+
+        value = session.execute(
+            select(type_coerce(MetadataModel.image, Unicode))
+        ).scalar_one()
+
+    assert value.startswith("image.jpg#w=800&h=400&o=6&bh=")
+
+    # Metadata is read from the column without opening the image.
+    Path(storage.get_path("image.jpg")).rename(tmp_path / "moved.jpg")
+
+    with Session(engine) as session:
+        model = session.execute(select(MetadataModel)).scalar_one()
+
+        assert model.image.name == "image.jpg"
+        assert (model.image.width, model.image.height) == (800, 400)
+        assert model.image.orientation == 6
+        assert model.image.blurhash is not None
+        assert model.image.dominant_color is not None
+        assert model.image.dominant_color.startswith("#c8")
+
+        session.add(MetadataModel(image=model.image))
+        session.commit()
+
+        values = session.execute(
+            select(type_coerce(MetadataModel.image, Unicode))
+        ).scalars()
+
+        assert set(values) == {value}
+
+    (tmp_path / "moved.jpg").rename(storage.get_path("image.jpg"))
+    storage.write(input_file.open("rb"), "orphan.jpg")
+
+    with Session(engine) as session:
+        orphans = find_orphans(session, MetadataModel.image, older_than=0)
+
+        assert [file.name for file in orphans] == ["orphan.jpg"]
+
+
+def test_find_orphans_with_metadata(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    MetadataModel.image.type.storage = storage
+
+    for i in range(1200):
+        (tmp_path / f"{i:0{i % 4 + 1}}.jpg").touch()
+
+    fragment = "#w=1&h=1&o=1&bh=00TSUA&c=%23ffffff"
+    rows = [
+        {"image": f"{i:0{i % 4 + 1}}.jpg" + (fragment if i % 2 else "")}
+        for i in range(1200)
+        if i % 3
+    ]
+
+    with Session(engine) as session:
+        session.execute(insert(MetadataModel), rows)
+        session.commit()
+
+        orphans = find_orphans(session, MetadataModel.image, older_than=0)
+
+        assert sorted(file.name for file in orphans) == sorted(
+            f"{i:0{i % 4 + 1}}.jpg" for i in range(0, 1200, 3)
+        )
+
+
+def test_backfill_image_metadata(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path))
+    Model.image.type.storage = storage
+
+    for name in ["a.png", "b.png", "c.png"]:
+        Image.new("RGB", (80, 40), (20, 20, 200)).save(tmp_path / name, "PNG")
+    (tmp_path / "invalid.png").write_bytes(b"123")
+
+    with Session(engine) as session:
+        for name in ["a.png", "b.png", "b.png", "c.png", "invalid.png", "missing.png"]:
+            session.add(Model(image=name))
+        session.commit()
+
+        assert backfill_image_metadata(session, Model.image, batch_size=2) == 4
+        session.commit()
+
+        values = session.execute(select(type_coerce(Model.image, Unicode))).scalars()
+        names = [value.split("#")[0] for value in values if "#" in value]
+
+        assert sorted(names) == ["a.png", "b.png", "b.png", "c.png"]
+        assert backfill_image_metadata(session, Model.image) == 0
+
+        model = session.execute(select(Model).where(Model.id == 1)).scalar_one()
+
+        assert model.image.name == "a.png"
+        assert model.image.dominant_color == "#1414c8"
@@ -0,0 +1,85 @@
+import threading
+import time
+from typing import List
+
+from fastapi_storages.limiter import ConcurrencyLimiter, get_limiter, is_throttled
+
+
+class HTTPResponse:
+    def __init__(self, status_code: int) -> None:
+        self.status_code = status_code
+
+
+def test_limiter_aimd() -> None:
+    limiter = ConcurrencyLimiter(max_limit=8, min_limit=2, backoff_interval=60)
+
+    limiter.throttled()
+    limiter.throttled()
+
+    assert limiter.limit == 4
+    assert limiter.metrics["throttled"] == 2
+
+    for _ in range(5):
+        with limiter.acquire():
+            pass
+
+    assert limiter.limit == 5
+
+    limiter = ConcurrencyLimiter(max_limit=8, min_limit=2, backoff_interval=0)
+    for _ in range(5):
+        limiter.throttled()
+
+    assert limiter.limit == 2
+
+    for _ in range(1000):
+        with limiter.acquire("bulk"):
+            pass
+
+    assert limiter.limit == 8
+
+
+def test_limiter_priority_lanes() -> None:
+    limiter = ConcurrencyLimiter(max_limit=2)
+    started: List[str] = []
+
+    def run(priority: str) -> None:
+        with limiter.acquire(priority):
+            started.append(priority)
+
+    with limiter.acquire("bulk"):
+        threads = [threading.Thread(target=run, args=("bulk",))]
+        threads[0].start()
+        time.sleep(0.05)
+
+        # Bulk requests use at most half of the limit.
+        assert limiter.metrics["queued"] == {"interactive": 0, "bulk": 1}
+
+        with limiter.acquire("interactive"):
+            assert limiter.metrics["in_flight"] == {"interactive": 1, "bulk": 1}
+
+            threads.append(threading.Thread(target=run, args=("interactive",)))
+            threads[1].start()
+            time.sleep(0.05)
+
+            assert limiter.metrics["queued"] == {"interactive": 1, "bulk": 1}
+
+    for thread in threads:
+        thread.join()
+
+    assert started == ["interactive", "bulk"]
+    assert limiter.metrics["in_flight"] == {"interactive": 0, "bulk": 0}
+
+
+def test_get_limiter() -> None:
+    limiter = get_limiter("http://endpoint", "bucket", 10)
+
+    assert get_limiter("http://endpoint", "bucket", 20) is limiter
+    assert get_limiter("http://endpoint", "other", 20) is not limiter
+    assert limiter.limit == 10
+
+
+def test_is_throttled() -> None:
+    assert is_throttled(None) is False
+    assert is_throttled((HTTPResponse(200), {})) is False
+    assert is_throttled((HTTPResponse(503), {})) is True
+    assert is_throttled((HTTPResponse(400), {"Error": {"Code": "SlowDown"}})) is True
@@ -0,0 +1,65 @@
+import io
+
+import pytest
+
+from fastapi_storages import MemoryStorage, StorageFile
+from fastapi_storages.exceptions import ValidationException
+
+
+def test_memory_storage_file_properties() -> None:
+    storage = MemoryStorage()
+    file = StorageFile(name="a/example (1).txt", storage=storage)
+    file.write(file=io.BytesIO(b"123"))
+
+    assert file.name == "a/example_1.txt"
+    assert file.path == "memory://a/example_1.txt"
+    assert file.size == 3
+    assert file.open().read() == b"123"
+    assert file.view().tobytes() == b"123"
+    assert [info.name for info in storage.iter_files("a/")] == ["a/example_1.txt"]
+
+
+def test_memory_storage_rename_file_names() -> None:
+    class NonOverwritingMemoryStorage(MemoryStorage):
+        OVERWRITE_EXISTING_FILES = False
+
+    storage = NonOverwritingMemoryStorage()
+    files = [StorageFile(name="duplicate.txt", storage=storage) for _ in range(3)]
+    for file in files:
+        file.write(file=io.BytesIO(b"123"))
+
+    assert [file.name for file in files] == [
+        "duplicate.txt",
+        "duplicate_1.txt",
+        "duplicate_2.txt",
+    ]
+
+
+def test_memory_storage_delete_file() -> None:
+    storage = MemoryStorage()
+    file = StorageFile(name="example.txt", storage=storage)
+    file.write(file=io.BytesIO(b"123"))
+    file.delete()
+
+    with pytest.raises(FileNotFoundError):
+        file.open()
+
+    with pytest.raises(FileNotFoundError):
+        file.delete()
+
+
+def test_memory_storage_evicts_least_recently_used() -> None:
+    storage = MemoryStorage(max_bytes=10)
+    storage.write(io.BytesIO(b"1234"), "a.txt")
+    storage.write(io.BytesIO(b"1234"), "b.txt")
+    storage.open("a.txt")
+    storage.write(io.BytesIO(b"1234"), "c.txt")
+
+    assert sorted(info.name for info in storage.iter_files()) == ["a.txt", "c.txt"]
+
+    storage.write(io.BytesIO(b"12345678"), "a.txt")
+
+    assert [info.name for info in storage.iter_files()] == ["a.txt"]
+
+    with pytest.raises(ValidationException):
+        storage.write(io.BytesIO(b"1" * 11), "d.txt")
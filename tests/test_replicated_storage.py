@@ -0,0 +1,146 @@
+import io
+from typing import BinaryIO
+
+import pytest
+
+from fastapi_storages import MemoryStorage, ReplicatedStorage, StorageFile
+from fastapi_storages.exceptions import ValidationException
+
+
+class FlakyStorage(MemoryStorage):
+    def __init__(self, failures: int = 1) -> None:
+        super().__init__()
+        self.failures = failures
+
+    def write(self, file: BinaryIO, name: str) -> str:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Replica is unavailable")
+        return super().write(file, name)
+
+    def open(self, name: str) -> BinaryIO:
+        raise ConnectionError("Replica is unavailable")
+
+
+class LimitedStorage(MemoryStorage):
+    MAX_FILE_SIZE = 1
+
+
+class VersionedStorage(MemoryStorage):
+    def write(self, file: BinaryIO, name: str) -> str:
+        return super().write(file, f"v1-{name}")
+
+
+def test_replicated_storage_write_and_read() -> None:
+    replicas = [MemoryStorage(), MemoryStorage(), MemoryStorage()]
+    storage = ReplicatedStorage(replicas)
+    file = StorageFile(name="example (1).txt", storage=storage)
+    file.write(io.BytesIO(b"123"))
+    storage.wait()
+
+    assert file.name == "example_1.txt"
+    assert file.path == "memory://example_1.txt"
+    assert file.size == 3
+    assert file.open().read() == b"123"
+    assert file.view() == b"123"
+    assert [replica.open("example_1.txt").read() for replica in replicas] == [
+        b"123"
+    ] * 3
+    assert [info.name for info in storage.iter_files()] == ["example_1.txt"]
+
+    file.delete()
+    storage.wait()
+
+    assert [list(replica.iter_files()) for replica in replicas] == [[], [], []]
+
+    with pytest.raises(FileNotFoundError):
+        file.delete()
+
+    with pytest.raises(FileNotFoundError):
+        file.open()
+
+
+def test_replicated_storage_repairs_failed_replicas() -> None:
+    flaky = FlakyStorage(failures=2)
+    storage = ReplicatedStorage([MemoryStorage(), flaky, MemoryStorage()])
+    storage.write(io.BytesIO(b"123"), "example.txt")
+    storage.wait()
+
+    # The background repair failed as well.
+    assert list(flaky.iter_files()) == []
+    assert storage.repair() == 1
+    assert storage.repair() == 0
+    assert flaky.get_size("example.txt") == 3
+
+
+def test_replicated_storage_quorum() -> None:
+    storage = ReplicatedStorage([MemoryStorage(), FlakyStorage(), FlakyStorage()])
+
+    with pytest.raises(ConnectionError):
+        storage.write(io.BytesIO(b"123"), "example.txt")
+
+    storage.wait()
+    assert storage.repair() == 0
+
+    storage = ReplicatedStorage([MemoryStorage(), LimitedStorage()], write_quorum=2)
+
+    with pytest.raises(ValidationException):
+        storage.write(io.BytesIO(b"123"), "example.txt")
+
+    with pytest.raises(AssertionError):
+        ReplicatedStorage([MemoryStorage()], write_quorum=2)
+
+
+def test_replicated_storage_reads_fail_over() -> None:
+    replicas = [FlakyStorage(failures=0), MemoryStorage()]
+    storage = ReplicatedStorage(replicas)
+    storage.write(io.BytesIO(b"123"), "example.txt")
+
+    assert storage.open("example.txt").read() == b"123"
+    assert storage.latencies[0] >= storage.failure_penalty
+    assert storage.latencies[0] > storage.latencies[1]
+
+    # The slow replica is no longer tried first.
+    assert storage.open("example.txt").read() == b"123"
+    assert storage.latencies[0] >= storage.failure_penalty
+
+    # Until it is probed again after it recovered.
+    replicas[0] = MemoryStorage()
+    storage.storages[0] = replicas[0]
+    replicas[0].write(io.BytesIO(b"123"), "example.txt")
+    storage.probe_interval = 3
+
+    assert storage.open("example.txt").read() == b"123"
+    assert storage.latencies[0] < storage.failure_penalty
+
+
+def test_replicated_storage_names_from_primary() -> None:
+    storage = ReplicatedStorage([VersionedStorage(), MemoryStorage()], write_quorum=1)
+
+    assert storage.write(io.BytesIO(b"123"), "example.txt") == "v1-example.txt"
+
+    # The replica is repaired with the name of the primary.
+    storage.wait()
+    assert [info.name for info in storage.storages[1].iter_files()] == [
+        "v1-example.txt"
+    ]
+
+    storage = ReplicatedStorage([MemoryStorage(), VersionedStorage()], write_quorum=2)
+
+    with pytest.raises(ValueError):
+        storage.write(io.BytesIO(b"123"), "example.txt")
+
+    storage.wait()
+    assert [info.name for info in storage.storages[1].iter_files()] == []
+
+
+def test_replicated_storage_limits() -> None:
+    storage = ReplicatedStorage([MemoryStorage(), LimitedStorage()], write_quorum=1)
+    file = io.BytesIO(b"1" * 10 * 1024 * 1024)
+
+    with pytest.raises(ValidationException):
+        storage.write(file, "example.txt")
+
+    # The input is not spooled once the limit of a replica is crossed.
+    assert file.tell() < 1024 * 1024
+    assert list(storage.primary.iter_files()) == []
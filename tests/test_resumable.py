@@ -0,0 +1,186 @@
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import boto3
+import pytest
+from moto import mock_s3
+
+from fastapi_storages import FileSystemStorage, MemoryStorage
+from fastapi_storages.exceptions import ValidationException
+from fastapi_storages.resumable import FileSessionStore, ResumableUploads
+from tests.test_s3_storage import PrivateS3Storage
+
+
+def test_filesystem_resumable_upload(tmp_path: Path) -> None:
+    storage = FileSystemStorage(path=str(tmp_path / "files"), shard_depth=1)
+    uploads = ResumableUploads(storage, store=FileSessionStore(str(tmp_path / "s")))
+
+    session = uploads.create("example (1).txt", size=6)
+    uploads.write(session.id, b"123", offset=0)
+
+    # Partial files are not listed as stored files or moved by resharding.
+    assert list(storage.iter_files()) == []
+    assert storage.reshard() == 0
+
+    with pytest.raises(ValidationException):
+        uploads.write(session.id, b"456", offset=0)
+
+    with pytest.raises(ValidationException):
+        uploads.finish(session.id)
+
+    # Resume with a new instance sharing the session store.
+    uploads = ResumableUploads(storage, store=FileSessionStore(str(tmp_path / "s")))
+    assert uploads.get(session.id).offset == 3
+
+    uploads.write(session.id, b"456", offset=3)
+    file = uploads.finish(session.id)
+
+    assert file.name == "example_1.txt"
+    assert file.open().read() == b"123456"
+    assert [info.name for info in storage.iter_files()] == ["example_1.txt"]
+
+    with pytest.raises(ValidationException):
+        uploads.get(session.id)
+
+
+def test_filesystem_resumable_upload_limits(tmp_path: Path) -> None:
+    class LimitedFileSystemStorage(FileSystemStorage):
+        MAX_FILE_SIZE = 5
+        ALLOWED_CONTENT_TYPES = ["text/plain"]
+
+    uploads = ResumableUploads(LimitedFileSystemStorage(path=str(tmp_path)))
+
+    with pytest.raises(ValidationException):
+        uploads.create("example.txt", size=6)
+
+    session = uploads.create("example.txt", size=3)
+
+    with pytest.raises(ValidationException):
+        uploads.write(session.id, b"1234", offset=0)
+
+    with pytest.raises(ValidationException):
+        uploads.write(session.id, b"\x00\x01\x02", offset=0)
+
+
+def test_resumable_upload_cleanup(tmp_path: Path) -> None:
+    uploads = ResumableUploads(FileSystemStorage(path=str(tmp_path)), expires_in=0.1)
+    session = uploads.create("example.txt")
+    uploads.write(session.id, b"123", offset=0)
+    uploads.create("other.txt")
+
+    time.sleep(0.1)
+
+    with pytest.raises(ValidationException):
+        uploads.write(session.id, b"456", offset=3)
+
+    assert uploads.cleanup() == 2
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_resumable_upload_unsupported_storage() -> None:
+    with pytest.raises(AssertionError):
+        ResumableUploads(MemoryStorage())
+
+
+@mock_s3
+def test_s3_resumable_upload() -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    part_size = 5 * 1024 * 1024
+    content = b"1" * part_size + b"2" * part_size + b"3"
+    uploads = ResumableUploads(PrivateS3Storage(), part_size=part_size)
+
+    session = uploads.create("example.txt", size=len(content))
+    uploads.write(session.id, content[part_size * 2 :], offset=part_size * 2)
+    uploads.write(session.id, content[:part_size], offset=0)
+
+    with pytest.raises(ValidationException):
+        uploads.write(session.id, b"2", offset=part_size)
+
+    with pytest.raises(ValidationException):
+        uploads.finish(session.id)
+
+    uploads.write(session.id, content[part_size : part_size * 2], offset=part_size)
+    file = uploads.finish(session.id)
+
+    assert file.name == "example.txt"
+    assert file.size == len(content)
+    assert s3.get_object(Bucket="bucket", Key="example.txt")["Body"].read() == content
+
+
+@mock_s3
+def test_s3_resumable_upload_unknown_size() -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    uploads = ResumableUploads(PrivateS3Storage())
+    session = uploads.create("example.txt")
+    uploads.write(session.id, b"123", offset=0)
+
+    assert uploads.finish(session.id).size == 3
+
+    session = uploads.create("empty.txt")
+
+    assert uploads.finish(session.id).size == 0
+
+    session = uploads.create("aborted.txt")
+    uploads.abort(session.id)
+    uploads.abort(session.id)
+
+    assert s3.list_multipart_uploads(Bucket="bucket").get("Uploads", []) == []
+
+
+@mock_s3
+def test_s3_resumable_upload_shared_store(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    class LimitedS3Storage(PrivateS3Storage):
+        AWS_S3_MAX_CONCURRENCY = 1
+
+    part_size = 5 * 1024 * 1024
+    content = b"1" * part_size + b"2" * part_size + b"3"
+    store = FileSessionStore(str(tmp_path))
+    first = ResumableUploads(LimitedS3Storage(), store=store, part_size=part_size)
+    second = ResumableUploads(LimitedS3Storage(), store=store, part_size=part_size)
+
+    lock = threading.Lock()
+    parts = {"running": 0, "max_running": 0}
+
+    def before_part(**kwargs: Any) -> None:
+        with lock:
+            parts["running"] += 1
+            parts["max_running"] = max(parts["max_running"], parts["running"])
+        time.sleep(0.05)
+
+    def after_part(**kwargs: Any) -> None:
+        with lock:
+            parts["running"] -= 1
+
+    first.storage._s3.meta.events.register("before-call.s3.UploadPart", before_part)
+    first.storage._s3.meta.events.register("after-call.s3.UploadPart", after_part)
+
+    session = first.create("example.txt", size=len(content))
+    stale = store.get(session.id)
+    threads = [
+        threading.Thread(
+            target=first.write, args=(session.id, content[offset:][:part_size], offset)
+        )
+        for offset in (0, part_size)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Parts recorded by one process are overwritten by another one.
+    assert stale is not None
+    store.save(stale)
+    second.write(session.id, content[part_size * 2 :], offset=part_size * 2)
+
+    assert parts["max_running"] == 1
+    assert second.finish(session.id).size == len(content)
+    assert s3.get_object(Bucket="bucket", Key="example.txt")["Body"].read() == content
@@ -1,5 +1,9 @@
+import io
 import os
+import threading
+import time
 from pathlib import Path
+from typing import Any, Dict
 
 import boto3
 import pytest
@@ -7,6 +11,7 @@ from botocore.exceptions import ClientError
 from moto import mock_s3
 
 from fastapi_storages import S3Storage, StorageFile
+from fastapi_storages.exceptions import ValidationException
 
 os.environ["MOTO_S3_CUSTOM_ENDPOINTS"] = "http://custom.s3.endpoint"
 
@@ -134,3 +139,493 @@ def test_s3_storage_delete_file(tmp_path: Path) -> None:
 
     with pytest.raises(ClientError):
         s3.head_object(Bucket="bucket", Key="file.txt")
+
+
+@mock_s3
+def test_s3_storage_max_file_size(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    tmp_file = tmp_path / "example.txt"
+    tmp_file.write_bytes(b"1" * 1024)
+
+    class TestStorage(PrivateS3Storage):
+        MAX_FILE_SIZE = 100
+
+    storage = TestStorage()
+
+    with pytest.raises(ValidationException):
+        storage.write(tmp_file.open("rb"), "example.txt")
+
+    with pytest.raises(ClientError):
+        s3.head_object(Bucket="bucket", Key="example.txt")
+
+
+@mock_s3
+def test_s3_storage_iter_files(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    tmp_file = tmp_path / "example.txt"
+    tmp_file.write_bytes(b"123")
+
+    storage = PrivateS3Storage()
+    for name in ("a.txt", "b/1.txt", "b/2.txt"):
+        storage.write(tmp_file.open("rb"), name)
+
+    files = list(storage.iter_files())
+
+    assert [file.name for file in files] == ["a.txt", "b/1.txt", "b/2.txt"]
+    assert all(file.size == 3 and file.mtime > 0 for file in files)
+    assert [file.name for file in storage.iter_files("b/")] == ["b/1.txt", "b/2.txt"]
+
+
+@mock_s3
+def test_s3_storage_compression(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    content = b'{"key": "value"}' * 10000
+    tmp_file = tmp_path / "example.json"
+    tmp_file.write_bytes(content)
+
+    class TestStorage(PrivateS3Storage):
+        AWS_S3_COMPRESSION = {"application/*": "gzip"}
+
+    storage = TestStorage()
+    storage.write(tmp_file.open("rb"), "example.json")
+    storage.write(tmp_file.open("rb"), "example.txt")
+
+    response = s3.head_object(Bucket="bucket", Key="example.json")
+
+    assert response["ContentEncoding"] == "gzip"
+    assert response["ContentLength"] < len(content)
+    assert storage.get_size("example.json") == len(content)
+    assert storage.open("example.json").read() == content
+    assert storage.get_size("example.txt") == len(content)
+    assert storage.open("example.txt").read() == content
+
+
+@mock_s3
+def test_s3_storage_compression_zstd() -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    class TestStorage(PrivateS3Storage):
+        AWS_S3_COMPRESSION = {"application/*": "zstd"}
+
+    with pytest.raises(AssertionError):
+        TestStorage()
+
+    # Objects compressed with zstd before it was restricted are still readable.
+    content = b'{"key": "value"}' * 100
+    storage = PrivateS3Storage()
+    storage.AWS_S3_COMPRESSION = {"application/*": "zstd"}
+    storage.write(io.BytesIO(content), "example.json")
+    response = s3.head_object(Bucket="bucket", Key="example.json")
+
+    assert response["ContentEncoding"] == "zstd"
+    assert PrivateS3Storage().open("example.json").read() == content
+
+
+@mock_s3
+def test_s3_storage_retry_config() -> None:
+    class TestStorage(PrivateS3Storage):
+        AWS_S3_RETRY_MODE = "adaptive"
+        AWS_S3_MAX_ATTEMPTS = 5
+        AWS_S3_READ_TIMEOUT = 5.0
+
+    storage = TestStorage()
+    config = storage._s3.meta.config
+
+    assert config.retries == {"mode": "adaptive", "total_max_attempts": 5}
+    assert config.read_timeout == 5.0
+
+
+@mock_s3
+def test_s3_storage_hedged_requests(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    tmp_file = tmp_path / "example.txt"
+    tmp_file.write_bytes(b"123")
+
+    class TestStorage(PrivateS3Storage):
+        AWS_S3_HEDGE_AFTER = 0.05
+
+    storage = TestStorage()
+    storage.write(tmp_file.open("rb"), "example.txt")
+
+    assert storage.get_size("example.txt") == 3
+    assert storage.open("example.txt").read() == b"123"
+
+    calls = []
+    head_object = storage._s3.head_object
+
+    def slow_head_object(**kwargs: Any) -> Any:
+        calls.append(kwargs)
+        if len(calls) == 1:
+            time.sleep(0.5)
+        return head_object(**kwargs)
+
+    storage._s3.head_object = slow_head_object
+
+    assert storage.get_size("example.txt") == 3
+    assert storage.hedge_counters == {"requests": 3, "hedged": 1, "hedge_wins": 1}
+
+    with pytest.raises(ClientError):
+        storage.get_size("missing.txt")
+
+
+@mock_s3
+def test_s3_storage_hedged_requests_under_load() -> None:
+    class TestStorage(PrivateS3Storage):
+        AWS_S3_HEDGE_AFTER = 0.1
+
+    storage = TestStorage()
+
+    def request() -> None:
+        for _ in range(4):
+            storage._send_hedged(lambda: time.sleep(0.03))
+
+    # Waiting for a free worker of the pool doesn't count as latency.
+    threads = [threading.Thread(target=request) for _ in range(64)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert storage.hedge_counters == {"requests": 256, "hedged": 0, "hedge_wins": 0}
+
+    # Concurrent reads don't wait for each other in the pool.
+    def read() -> None:
+        storage._send_hedged(lambda: time.sleep(0.2))
+
+    threads = [threading.Thread(target=read) for _ in range(64)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.monotonic() - start < 1
+
+    class SlowStorage(PrivateS3Storage):
+        AWS_S3_HEDGE_AFTER = 0.001
+
+    storage = SlowStorage()
+    for _ in range(20):
+        storage._send_hedged(lambda: time.sleep(0.01))
+
+    assert storage.hedge_counters["hedged"] == 2
+
+
+@mock_s3
+def test_s3_storage_get_metadata_many(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    tmp_file = tmp_path / "example.txt"
+    tmp_file.write_bytes(b"123")
+
+    storage = PrivateS3Storage()
+    for name in ("a/1.txt", "a/2.txt", "a/3.txt", "a/4.txt", "b.txt"):
+        storage.write(tmp_file.open("rb"), name)
+
+    metadata = storage.get_metadata_many(["a/2.txt", "a/3.txt", "a/5.txt"])
+
+    assert sorted(metadata) == ["a/2.txt", "a/3.txt"]
+    assert metadata["a/2.txt"].size == 3
+
+    metadata = storage.get_metadata_many(["a/1.txt", "b.txt", "c.txt"])
+
+    assert sorted(metadata) == ["a/1.txt", "b.txt"]
+    assert metadata["b.txt"] == storage.get_metadata("b.txt")
+
+
+@mock_s3
+def test_s3_storage_get_metadata_many_listing(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    tmp_file = tmp_path / "example.txt"
+    tmp_file.write_bytes(b"123")
+
+    storage = PrivateS3Storage()
+    for i in range(40):
+        storage.write(tmp_file.open("rb"), f"a/{i:02}.txt")
+
+    requests: Dict[str, int] = {"ListObjectsV2": 0, "HeadObject": 0}
+
+    def count(model: Any, **kwargs: Any) -> None:
+        requests[model.name] = requests.get(model.name, 0) + 1
+
+    def page_size(params: Dict[str, Any], **kwargs: Any) -> None:
+        params["MaxKeys"] = 10
+
+    storage._s3.meta.events.register("before-call.s3", count)
+    storage._s3.meta.events.register(
+        "before-parameter-build.s3.ListObjectsV2", page_size
+    )
+
+    names = [f"a/{i:02}.txt" for i in range(10, 20)] + ["a/15.png"]
+    metadata = storage.get_metadata_many(names)
+
+    assert sorted(metadata) == names[:-1]
+    assert requests == {"ListObjectsV2": 1, "HeadObject": 0}
+
+    # Listing stops after one page for ten keys spread over the whole range.
+    requests.update({"ListObjectsV2": 0, "HeadObject": 0})
+    names = [f"a/{i:02}.txt" for i in range(0, 40, 4)]
+    metadata = storage.get_metadata_many(names)
+
+    assert sorted(metadata) == names
+    assert requests == {"ListObjectsV2": 1, "HeadObject": 7}
+
+
+@mock_s3
+def test_s3_storage_object_parameters(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    tmp_file = tmp_path / "example.txt"
+    tmp_file.write_bytes(b"123")
+
+    class TestStorage(PrivateS3Storage):
+        AWS_S3_OBJECT_PARAMETERS = {
+            "CacheControl": "max-age=86400",
+            "Metadata": {"owner": "storage"},
+        }
+
+        def get_object_parameters(self, name: str) -> Dict[str, Any]:
+            params = super().get_object_parameters(name)
+            params["ContentDisposition"] = f'attachment; filename="{name}"'
+            return params
+
+    storage = TestStorage()
+    storage.write(tmp_file.open("rb"), "example.txt")
+    storage.write(
+        tmp_file.open("rb"),
+        "other.txt",
+        params={"Metadata": {"owner": "write"}, "StorageClass": "STANDARD_IA"},
+    )
+
+    response = s3.head_object(Bucket="bucket", Key="example.txt")
+
+    assert response["CacheControl"] == "max-age=86400"
+    assert response["ContentDisposition"] == 'attachment; filename="example.txt"'
+    assert response["Metadata"] == {"owner": "storage"}
+
+    response = s3.head_object(Bucket="bucket", Key="other.txt")
+
+    assert response["Metadata"] == {"owner": "write"}
+    assert response["StorageClass"] == "STANDARD_IA"
+
+
+@mock_s3
+def test_s3_storage_versioned_keys(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    tmp_file = tmp_path / "example.txt"
+    tmp_file.write_bytes(b"123")
+
+    class TestStorage(PrivateS3Storage):
+        AWS_S3_VERSIONED_KEYS = True
+        MAX_FILE_SIZE = 10
+
+    storage = TestStorage()
+    file = StorageFile(name="a/example.txt", storage=storage)
+    file.write(tmp_file.open("rb"))
+
+    assert file.name == "a/example.a665a45920422f9d.txt"
+    assert (
+        file.path == "http://custom.s3.endpoint/bucket/a/example.a665a45920422f9d.txt"
+    )
+    assert file.open().read() == b"123"
+
+    response = s3.head_object(Bucket="bucket", Key=file.name)
+
+    assert response["CacheControl"] == "public, max-age=31536000, immutable"
+
+    tmp_file.write_bytes(b"1234567890a")
+
+    with pytest.raises(ValidationException):
+        StorageFile(name="example.txt", storage=storage).write(tmp_file.open("rb"))
+
+
+@mock_s3
+def test_s3_storage_lazy_client(monkeypatch: pytest.MonkeyPatch) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    storage = PrivateS3Storage()
+
+    assert storage._client is None
+
+    client = storage._s3
+
+    assert storage._s3 is client
+
+    # A new process gets its own client.
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+
+    assert storage._s3 is not client
+
+    class ThreadLocalS3Storage(PrivateS3Storage):
+        AWS_S3_THREAD_LOCAL_CLIENT = True
+
+    storage = ThreadLocalS3Storage()
+    clients = [storage._s3]
+    thread = threading.Thread(target=lambda: clients.append(storage._s3))
+    thread.start()
+    thread.join()
+
+    assert storage._s3 is clients[0]
+    assert clients[1] is not clients[0]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Requires fork")
+@mock_s3
+def test_s3_storage_reset_after_fork() -> None:
+    storage = PrivateS3Storage()
+    client = storage._s3
+
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        os._exit(0 if storage._client is None and storage._s3 is not client else 1)
+
+    _, status = os.waitpid(pid, 0)
+
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+    assert storage._s3 is client
+
+
+@mock_s3
+def test_s3_storage_concurrency_limit(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    tmp_file = tmp_path / "example.txt"
+    tmp_file.write_bytes(b"123")
+
+    class LimitedS3Storage(PrivateS3Storage):
+        AWS_S3_BUCKET_NAME = "limited"
+        AWS_S3_MAX_CONCURRENCY = 4
+
+    class BulkS3Storage(LimitedS3Storage):
+        AWS_S3_PRIORITY = "bulk"
+
+    s3.create_bucket(Bucket="limited")
+    storage = LimitedS3Storage()
+    bulk_storage = BulkS3Storage()
+
+    bulk_storage.write(tmp_file.open("rb"), "example.txt")
+    assert storage.get_size("example.txt") == 3
+    storage.delete("example.txt")
+
+    assert PrivateS3Storage().concurrency_metrics == {}
+    assert storage.concurrency_metrics == {
+        "limit": 4,
+        "in_flight": {"interactive": 0, "bulk": 0},
+        "queued": {"interactive": 0, "bulk": 0},
+        "throttled": 0,
+    }
+
+    class HTTPResponse:
+        status_code = 503
+
+    response = (HTTPResponse(), {"Error": {"Code": "SlowDown"}})
+    bulk_storage._on_needs_retry(response=response, attempts=1)
+
+    assert storage.concurrency_metrics["limit"] == 2
+    assert storage.concurrency_metrics["throttled"] == 1
+
+
+@mock_s3
+def test_s3_storage_concurrency_limit_multipart(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    tmp_file = tmp_path / "example.bin"
+    tmp_file.write_bytes(os.urandom(20 * 1024 * 1024))
+
+    class LimitedS3Storage(PrivateS3Storage):
+        AWS_S3_MAX_CONCURRENCY = 4
+
+    storage = LimitedS3Storage()
+    lock = threading.Lock()
+    parts = {"running": 0, "max_running": 0, "count": 0}
+
+    def before_part(**kwargs: Any) -> None:
+        with lock:
+            parts["running"] += 1
+            parts["count"] += 1
+            parts["max_running"] = max(parts["max_running"], parts["running"])
+        time.sleep(0.05)
+
+    def after_part(**kwargs: Any) -> None:
+        with lock:
+            parts["running"] -= 1
+
+    storage._s3.meta.events.register("before-call.s3.UploadPart", before_part)
+    storage._s3.meta.events.register("after-call.s3.UploadPart", after_part)
+    storage.write(tmp_file.open("rb"), "example.bin")
+
+    # Parts of a multipart upload don't exceed the slot held by the write.
+    assert parts["count"] == 3
+    assert parts["max_running"] == 1
+
+
+@mock_s3
+def test_s3_storage_download(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    content = os.urandom(100_000)
+    s3.put_object(Bucket="bucket", Key="example.bin", Body=content)
+    s3.put_object(Bucket="bucket", Key="empty.bin", Body=b"")
+
+    storage = PrivateS3Storage()
+    path = tmp_path / "example.bin"
+
+    assert storage.download("example.bin", path, part_size=30_000) == len(content)
+    assert path.read_bytes() == content
+
+    buffer = bytearray(len(content) + 10)
+
+    assert storage.download("example.bin", buffer, part_size=7_000, max_workers=4) == (
+        len(content)
+    )
+    assert buffer[: len(content)] == content
+
+    assert storage.download("empty.bin", str(path)) == 0
+    assert path.read_bytes() == b""
+
+    with pytest.raises(AssertionError):
+        storage.download("example.bin", bytearray(10))
+
+
+@mock_s3
+def test_s3_storage_download_compressed(tmp_path: Path) -> None:
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="bucket")
+
+    content = b"123" * 10000
+    tmp_file = tmp_path / "example.txt"
+    tmp_file.write_bytes(content)
+
+    class TestStorage(PrivateS3Storage):
+        AWS_S3_COMPRESSION = {"text/*": "gzip"}
+
+    storage = TestStorage()
+    storage.write(tmp_file.open("rb"), "example.txt")
+    path = tmp_path / "download.txt"
+
+    assert storage.download("example.txt", path, part_size=100) == len(content)
+    assert path.read_bytes() == content
+
+    buffer = bytearray(len(content))
+
+    assert storage.download("example.txt", buffer) == len(content)
+    assert buffer == content